@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Benchmark de carga concurrente para el Sistema de Citas Médicas API
+
+Ejecuta escenarios (reservas, disponibilidad, historial) con varios clientes
+concurrentes y reporta peticiones por segundo y latencias p50/p95/p99 por
+endpoint. Los resultados se pueden guardar en JSON y comparar entre commits.
+
+Uso:
+    python benchmark.py --concurrencia 32 --duracion 60 --salida antes.json
+    python benchmark.py --concurrencia 32 --duracion 60 --comparar antes.json
+"""
+
+import argparse
+import http.client
+import json
+import math
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from urllib.parse import urlencode, urlsplit
+
+# Mismos horarios que crud.HORARIOS_BASE (el benchmark no importa la aplicación)
+HORARIOS = [
+    "08:00", "08:30", "09:00", "09:30", "10:00", "10:30", "11:00", "11:30",
+    "14:00", "14:30", "15:00", "15:30", "16:00", "16:30", "17:00", "17:30"
+]
+
+# Peso de cada escenario en las mezclas predefinidas
+MEZCLAS = {
+    "mixto": {"reservas": 2, "disponibilidad": 5, "historial": 3},
+    "reservas": {"reservas": 1},
+    "disponibilidad": {"disponibilidad": 1},
+    "historial": {"historial": 1}
+}
+
+# ===========================================
+# Cliente HTTP
+# ===========================================
+class Cliente:
+    """Conexión keep-alive de un hilo; registra la latencia de cada petición por endpoint"""
+
+    def __init__(self, url: str, timeout: float):
+        partes = urlsplit(url)
+        self.host = partes.hostname
+        self.port = partes.port
+        self.https = partes.scheme == "https"
+        self.base = partes.path.rstrip("/")
+        self.timeout = timeout
+        self.conexion = None
+        self.muestras = defaultdict(list)  # endpoint -> [(segundos, status)]
+        self.citas_creadas = []  # ids a eliminar al terminar
+
+    def _conectar(self):
+        clase = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        self.conexion = clase(self.host, self.port, timeout=self.timeout)
+
+    def peticion(self, endpoint: str, metodo: str, ruta: str, params: dict = None, cuerpo=None):
+        """Ejecuta una petición y retorna (status, JSON de la respuesta o None); status 0 = error de conexión"""
+        if params:
+            ruta = f"{ruta}?{urlencode(params)}"
+        headers = {"Accept": "application/json"}
+        datos = None
+        if cuerpo is not None:
+            datos = json.dumps(cuerpo, default=str).encode()
+            headers["Content-Type"] = "application/json"
+
+        if self.conexion is None:
+            self._conectar()
+        inicio = time.perf_counter()
+        try:
+            self.conexion.request(metodo, self.base + ruta, body=datos, headers=headers)
+            respuesta = self.conexion.getresponse()
+            contenido = respuesta.read()
+            status = respuesta.status
+        except (OSError, http.client.HTTPException):
+            self.conexion.close()
+            self.conexion = None
+            self.muestras[endpoint].append((time.perf_counter() - inicio, 0))
+            return 0, None
+        self.muestras[endpoint].append((time.perf_counter() - inicio, status))
+
+        try:
+            return status, json.loads(contenido) if contenido else None
+        except ValueError:
+            return status, None
+
+    def cerrar(self):
+        if self.conexion is not None:
+            self.conexion.close()
+
+# ===========================================
+# Escenarios
+# ===========================================
+class Datos:
+    """Ids existentes y fechas sobre las que trabajan los escenarios"""
+
+    def __init__(self, pacientes: list, doctores: list, especialidades: list, dias: list):
+        self.pacientes = pacientes
+        self.doctores = doctores
+        self.especialidades = especialidades
+        self.dias = dias
+        # Días de las reservas; cada ejecución elige los suyos (ver ejecutar)
+        self.dias_reserva = dias[:3]
+
+def _dias_habiles(desde: date, cantidad: int) -> list:
+    """Los próximos 'cantidad' días de lunes a viernes desde 'desde'"""
+    dias = []
+    dia = desde
+    while len(dias) < cantidad:
+        if dia.weekday() < 5:
+            dias.append(dia)
+        dia += timedelta(days=1)
+    return dias
+
+def escenario_reservas(cliente: Cliente, datos: Datos, rng: random.Random):
+    """Ráfaga de reservas: varios clientes compiten por los horarios de pocos doctores.
+
+    Se reserva directamente, como lo haría un cliente real: un 409 (horario ya
+    reservado) es la respuesta esperada cuando se pierde la carrera.
+    """
+    doctor = rng.choice(datos.doctores[:5])
+    dia = rng.choice(datos.dias_reserva)
+    hora = rng.choice(HORARIOS)
+    status, respuesta = cliente.peticion("POST /citas/", "POST", "/citas/", cuerpo={
+        "fecha_hora": datetime.combine(dia, datetime.strptime(hora, "%H:%M").time()).isoformat(),
+        "motivo": "Benchmark",
+        "id_paciente": rng.choice(datos.pacientes),
+        "id_doctor": doctor
+    })
+    if status == 201 and respuesta:
+        cliente.citas_creadas.append(respuesta["id_cita"])
+
+def escenario_disponibilidad(cliente: Cliente, datos: Datos, rng: random.Random):
+    """Navegación de disponibilidad: un día por especialidad y luego la semana"""
+    dia = rng.choice(datos.dias)
+    params = {"fecha": dia.isoformat()}
+    if datos.especialidades and rng.random() < 0.7:
+        params["id_especialidad"] = rng.choice(datos.especialidades)
+    cliente.peticion("GET /disponibilidad/", "GET", "/disponibilidad/", params)
+
+    if rng.random() < 0.3:
+        cliente.peticion("GET /disponibilidad/calendario/", "GET", "/disponibilidad/calendario/", {
+            "fecha_desde": dia.isoformat(),
+            "fecha_hasta": (dia + timedelta(days=6)).isoformat(),
+            "id_doctor": rng.choice(datos.doctores)
+        })
+
+def escenario_historial(cliente: Cliente, datos: Datos, rng: random.Random):
+    """Consulta de un paciente: ficha, historial médico y citas"""
+    paciente = rng.choice(datos.pacientes)
+    cliente.peticion("GET /pacientes/{id}", "GET", f"/pacientes/{paciente}")
+    cliente.peticion("GET /historial/paciente/{id}", "GET", f"/historial/paciente/{paciente}")
+    cliente.peticion("GET /citas/paciente/{id}", "GET", f"/citas/paciente/{paciente}")
+
+ESCENARIOS = {
+    "reservas": escenario_reservas,
+    "disponibilidad": escenario_disponibilidad,
+    "historial": escenario_historial
+}
+
+def cargar_datos(url: str, timeout: float, dias: int) -> Datos:
+    """Lee ids de pacientes, doctores y especialidades existentes"""
+    cliente = Cliente(url, timeout)
+    ids = {}
+    for ruta, campo in (("/pacientes/", "id_paciente"), ("/doctores/", "id_doctor"),
+                        ("/especialidades/", "id_especialidad")):
+        status, filas = cliente.peticion(ruta, "GET", ruta, {"limite": 1000})
+        if status != 200:
+            raise RuntimeError(f"GET {ruta} respondió {status}")
+        ids[campo] = [fila[campo] for fila in filas]
+    cliente.cerrar()
+
+    if not ids["id_paciente"] or not ids["id_doctor"]:
+        raise RuntimeError("Se necesitan pacientes y doctores (ver generar_datos.py)")
+    manana = date.today() + timedelta(days=1)
+    return Datos(ids["id_paciente"], ids["id_doctor"], ids["id_especialidad"], _dias_habiles(manana, dias))
+
+# ===========================================
+# Ejecución y reporte
+# ===========================================
+def _percentil(ordenados: list, p: float) -> float:
+    """Percentil por rango más cercano de una lista ordenada"""
+    if not ordenados:
+        return 0.0
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+def _resumen(muestras: list, duracion: float) -> dict:
+    """RPS, latencias (ms) y códigos de estado de un conjunto de muestras"""
+    latencias = sorted(segundos * 1000 for segundos, _ in muestras)
+    estados = defaultdict(int)
+    for _, status in muestras:
+        estados[status] += 1
+    # 0 = error de conexión o timeout; los 4xx son respuestas válidas (p. ej. 409 al reservar)
+    errores = sum(n for status, n in estados.items() if status == 0 or status >= 500)
+    return {
+        "peticiones": len(muestras),
+        "errores": errores,
+        "rps": round(len(muestras) / duracion, 2) if duracion else 0.0,
+        "p50_ms": round(_percentil(latencias, 50), 2),
+        "p95_ms": round(_percentil(latencias, 95), 2),
+        "p99_ms": round(_percentil(latencias, 99), 2),
+        "max_ms": round(latencias[-1], 2) if latencias else 0.0,
+        "estados": {str(status): n for status, n in sorted(estados.items())}
+    }
+
+def ejecutar(args, datos: Datos) -> dict:
+    """Lanza los clientes concurrentes y retorna los resultados por endpoint"""
+    mezcla = MEZCLAS[args.escenario]
+    nombres = list(mezcla)
+    pesos = [mezcla[nombre] for nombre in nombres]
+
+    inicio_medicion = time.perf_counter() + args.calentamiento
+    fin = inicio_medicion + args.duracion
+    clientes = []
+
+    def trabajador(semilla: int):
+        rng = random.Random(semilla)
+        cliente = Cliente(args.url, args.timeout)
+        clientes.append(cliente)
+        while True:
+            ahora = time.perf_counter()
+            if ahora >= fin:
+                break
+            if ahora < inicio_medicion:
+                # Calentamiento: las muestras se descartan al empezar la medición
+                cliente.muestras.clear()
+            escenario = rng.choices(nombres, weights=pesos)[0]
+            ESCENARIOS[escenario](cliente, datos, rng)
+        cliente.cerrar()
+
+    semilla = args.semilla if args.semilla is not None else random.randrange(2 ** 32)
+    # Horarios libres en cada ejecución: las reservas caen en una semana lejana
+    # elegida con la semilla (y se eliminan al terminar, ver limpiar)
+    semana = random.Random(semilla).randrange(52, 52 * 20)
+    datos.dias_reserva = _dias_habiles(datos.dias[0] + timedelta(weeks=semana), 3)
+    hilos = [threading.Thread(target=trabajador, args=(semilla + i,), daemon=True)
+             for i in range(args.concurrencia)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio_medicion
+
+    por_endpoint = defaultdict(list)
+    for cliente in clientes:
+        for endpoint, muestras in cliente.muestras.items():
+            por_endpoint[endpoint].extend(muestras)
+    todas = [muestra for muestras in por_endpoint.values() for muestra in muestras]
+    reservas = por_endpoint.get("POST /citas/", [])
+
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit_actual(),
+        "configuracion": {
+            "url": args.url,
+            "escenario": args.escenario,
+            "concurrencia": args.concurrencia,
+            "duracion": args.duracion,
+            "semilla": semilla
+        },
+        "total": _resumen(todas, duracion),
+        "reservas": {
+            "creadas": sum(1 for _, status in reservas if status == 201),
+            "conflictos": sum(1 for _, status in reservas if status == 409)
+        },
+        "citas_creadas": [id_cita for cliente in clientes for id_cita in cliente.citas_creadas],
+        "endpoints": {endpoint: _resumen(muestras, duracion) for endpoint, muestras in sorted(por_endpoint.items())}
+    }
+
+def limpiar(args, ids: list) -> int:
+    """Elimina las citas creadas por la ejecución (fuera de la medición); retorna las eliminadas"""
+    cliente = Cliente(args.url, args.timeout)
+    eliminadas = sum(
+        1 for id_cita in ids
+        if cliente.peticion("DELETE /citas/{id}", "DELETE", f"/citas/{id_cita}")[0] == 200
+    )
+    cliente.cerrar()
+    return eliminadas
+
+def _commit_actual():
+    """Commit de git del directorio actual, si se puede obtener"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def imprimir(resultados: dict):
+    """Imprime la tabla de resultados por endpoint"""
+    print(f"\n{'Endpoint':<36} {'Peticiones':>10} {'Errores':>8} {'RPS':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    print("-" * 94)
+    filas = list(resultados["endpoints"].items()) + [("TOTAL", resultados["total"])]
+    for endpoint, r in filas:
+        print(f"{endpoint:<36} {r['peticiones']:>10} {r['errores']:>8} {r['rps']:>9.1f} "
+              f"{r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f}")
+
+def comparar(resultados: dict, base: dict):
+    """Imprime la variación de RPS y latencias respecto a una ejecución anterior"""
+    def variacion(actual, anterior):
+        return f"{(actual - anterior) / anterior * 100:+.1f}%" if anterior else "n/a"
+
+    print(f"\nComparación con {base.get('commit') or 'la ejecución base'} ({base.get('fecha')})")
+    print(f"{'Endpoint':<36} {'RPS':>9} {'p50':>9} {'p95':>9} {'p99':>9}")
+    print("-" * 76)
+    filas = list(resultados["endpoints"].items()) + [("TOTAL", resultados["total"])]
+    for endpoint, r in filas:
+        anterior = base["total"] if endpoint == "TOTAL" else base["endpoints"].get(endpoint)
+        if anterior is None:
+            continue
+        print(f"{endpoint:<36} {variacion(r['rps'], anterior['rps']):>9} "
+              f"{variacion(r['p50_ms'], anterior['p50_ms']):>9} "
+              f"{variacion(r['p95_ms'], anterior['p95_ms']):>9} "
+              f"{variacion(r['p99_ms'], anterior['p99_ms']):>9}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de carga del Sistema de Citas Médicas API")
+    parser.add_argument("--url", default="http://localhost:8000", help="URL base de la API")
+    parser.add_argument("--escenario", choices=sorted(MEZCLAS), default="mixto", help="Mezcla de escenarios")
+    parser.add_argument("--concurrencia", type=int, default=16, help="Clientes concurrentes")
+    parser.add_argument("--duracion", type=float, default=30, help="Segundos de medición")
+    parser.add_argument("--calentamiento", type=float, default=5, help="Segundos iniciales que no se miden")
+    parser.add_argument("--dias", type=int, default=10, help="Días hábiles futuros sobre los que se consulta y reserva")
+    parser.add_argument("--timeout", type=float, default=30, help="Timeout por petición en segundos")
+    parser.add_argument("--semilla", type=int, default=None, help="Semilla aleatoria de los clientes")
+    parser.add_argument("--conservar", action="store_true", help="No eliminar las citas creadas al terminar")
+    parser.add_argument("--salida", help="Guardar los resultados en este archivo JSON")
+    parser.add_argument("--comparar", help="Archivo JSON de una ejecución anterior para comparar")
+    args = parser.parse_args(argv)
+
+    if args.concurrencia < 1 or args.duracion <= 0 or args.dias < 3:
+        parser.error("--concurrencia y --duracion deben ser positivos y --dias al menos 3")
+    return args
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    try:
+        datos = cargar_datos(args.url, args.timeout, args.dias)
+    except (OSError, http.client.HTTPException, RuntimeError) as e:
+        print(f"❌ No se pudo preparar el benchmark: {e}")
+        return 1
+
+    print(f"🚀 Escenario '{args.escenario}' con {args.concurrencia} clientes durante {args.duracion:g} s "
+          f"(+{args.calentamiento:g} s de calentamiento)...")
+    resultados = ejecutar(args, datos)
+    creadas = resultados.pop("citas_creadas")
+    imprimir(resultados)
+    if resultados["reservas"]["creadas"] or resultados["reservas"]["conflictos"]:
+        print(f"\nReservas: {resultados['reservas']['creadas']} creadas, "
+              f"{resultados['reservas']['conflictos']} conflictos (409)")
+    if creadas and not args.conservar:
+        print(f"🧹 {limpiar(args, creadas)} citas del benchmark eliminadas")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as archivo:
+            comparar(resultados, json.load(archivo))
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+        print(f"\n💾 Resultados guardados en {args.salida}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+import threading
+import time
+
+# Todas las cachés creadas, por nombre, para consultar sus estadísticas
+_caches: Dict[str, "TTLCache"] = {}
+
+class TTLCache:
+    """Caché en memoria del proceso con expiración (TTL) y tamaño acotado (LRU).
+
+    Es local a cada worker: la invalidación explícita solo afecta al proceso
+    que hizo la escritura y el TTL acota cuánto tiempo pueden ver datos
+    desactualizados los demás.
+    """
+
+    def __init__(self, name: str, maxsize: int = 512, ttl: float = 300):
+        self.name = name
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self._data = OrderedDict()  # clave -> (valor, instante de expiración)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+        self._generation = 0  # aumenta con cada invalidación
+        _caches[name] = self
+
+    def get(self, key: Hashable, default=None):
+        """Valor vigente para la clave, o default si no existe o expiró"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if time.monotonic() < expires_at:
+                    self._data.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return value
+                del self._data[key]
+            self._stats["misses"] += 1
+            return default
+
+    def set(self, key: Hashable, value):
+        """Guarda un valor, desalojando el menos usado si se supera maxsize"""
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], object]):
+        """Valor en caché o, si falta, el resultado de loader(); None no se guarda.
+
+        Si hubo una invalidación mientras se ejecutaba loader(), el valor se
+        retorna pero no se guarda, porque pudo leerse antes de la escritura.
+        """
+        value = self.get(key)
+        if value is None:
+            generation = self._generation
+            value = loader()
+            if value is not None:
+                with self._lock:
+                    if generation != self._generation:
+                        return value
+                self.set(key, value)
+        return value
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Elimina una clave, o todo el contenido si no se indica ninguna"""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+            self._generation += 1
+            self._stats["invalidations"] += 1
+
+    def stats(self) -> dict:
+        """Estadísticas de la caché"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({"size": len(self._data), "maxsize": self.maxsize, "ttl": self.ttl})
+        return stats
+
+def get_cache_stats() -> Dict[str, dict]:
+    """Estadísticas de todas las cachés, por nombre"""
+    return {name: cache.stats() for name, cache in _caches.items()}
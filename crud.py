@@ -1,375 +1,796 @@
-from database import execute_query, execute_query_one
+from database import execute_query, execute_query_one, execute_update, insert_many, stream_query
+from cache import TTLCache
 from models import *
-from typing import List, Optional
-from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+import base64
+import binascii
+import json
+import os
+import re
+import database
+
+# ===========================================
+# Metadatos de las entidades
+# ===========================================
+class Join:
+    """Tabla unida a una entidad en las lecturas y las columnas que aporta"""
+
+    def __init__(self, tabla: str, alias: str, clave: str, columnas: Dict[str, str]):
+        self.alias = alias
+        self.clave = clave  # columna que referencia la tabla unida, p. ej. "c.id_paciente"
+        self.depende = clave.split(".")[0]  # alias que debe estar en el FROM antes que este JOIN
+        self.columnas = columnas  # clave en la fila -> expresión SQL
+        self.sql = f"JOIN {tabla} {alias} ON {clave} = {alias}.{clave.split('.')[1]}"
+
+class Entidad:
+    """Metadatos de una tabla: columnas, JOINs de lectura y orden de sus listados.
+
+    Las sentencias que no dependen de los datos se construyen una sola vez aquí.
+    """
+
+    def __init__(self, tabla: str, alias: str, pk: str, columnas: Tuple[str, ...],
+                 orden: tuple, joins: Tuple[Join, ...] = (), descendente: bool = False):
+        self.tabla = tabla
+        self.alias = alias
+        self.pk = pk
+        self.columnas = columnas  # columnas escribibles (sin la clave primaria)
+        self.orden = orden  # claves de ordenamiento: (columna SQL, clave en la fila)
+        self.joins = joins
+        self.descendente = descendente
+
+        # Campos del resultado de una lectura: clave en la fila -> expresión SQL
+        self.campos = {pk: f"{alias}.{pk}"}
+        self.campos.update({columna: f"{alias}.{columna}" for columna in columnas})
+        for join in joins:
+            self.campos.update(join.columnas)
+
+        self.sql_columnas = self._sql_columnas(self.campos)
+        self.sql_from = f" FROM {tabla} {alias}" + "".join(f" {join.sql}" for join in joins)
+        self.sql_select = f"SELECT {self.sql_columnas}{self.sql_from}"
+        self.sql_por_id = f"{self.sql_select} WHERE {alias}.{pk} = %s"
+        self.sql_insert = (
+            f"INSERT INTO {tabla} ({', '.join(columnas)}) "
+            f"VALUES ({', '.join(['%s'] * len(columnas))})"
+        )
+        self.sql_delete = f"DELETE FROM {tabla} WHERE {pk} = %s"
+
+    def _sql_columnas(self, campos: Dict[str, str]) -> str:
+        return ", ".join(
+            expresion if expresion == f"{self.alias}.{campo}" else f"{expresion} as {campo}"
+            for campo, expresion in campos.items()
+        )
+
+    def campos_pedidos(self, campos: Sequence[str]) -> frozenset:
+        """Campos pedidos más la clave primaria y las claves de ordenamiento (las usa el cursor).
+
+        Lanza ValueError si alguno no es un campo de la entidad.
+        """
+        desconocidos = set(campos) - self.campos.keys()
+        if desconocidos:
+            raise ValueError(f"Campos desconocidos: {', '.join(sorted(desconocidos))}")
+        return frozenset(campos) | {self.pk} | {clave for _, clave in self.orden}
+
+    def __repr__(self):
+        return f"Entidad({self.tabla!r})"
+
+@lru_cache(maxsize=256)
+def _proyeccion(entidad: Entidad, campos: frozenset) -> Tuple[str, Tuple[str, ...]]:
+    """SELECT con solo algunos campos y los JOIN que esos campos necesitan.
+
+    Un JOIN omitido se reemplaza por 'clave IS NOT NULL': la clave foránea
+    garantiza que la fila unida existe, así que el resultado no cambia.
+    Retorna la sentencia (sin WHERE) y las condiciones que hay que agregar.
+    """
+    seleccion = {campo: expresion for campo, expresion in entidad.campos.items() if campo in campos}
+    alias_usados = {expresion.split(".")[0] for expresion in seleccion.values()}
+    joins = []
+    # De atrás hacia adelante: un JOIN incluido arrastra al que lo precede (p. ej. e -> d)
+    for join in reversed(entidad.joins):
+        if join.alias in alias_usados:
+            joins.insert(0, join)
+            alias_usados.add(join.depende)
+    presentes = {entidad.alias} | {join.alias for join in joins}
+    condiciones = tuple(
+        f"{join.clave} IS NOT NULL" for join in entidad.joins
+        if join not in joins and join.depende in presentes
+    )
+    sql = f"SELECT {entidad._sql_columnas(seleccion)} FROM {entidad.tabla} {entidad.alias}"
+    return sql + "".join(f" {join.sql}" for join in joins), condiciones
+
+def _recortar(entidad: Entidad, contenido, campos: Optional[Sequence[str]]):
+    """Deja solo los campos pedidos de un registro o una lista (datos ya en caché)"""
+    if not campos or contenido is None:
+        return contenido
+    pedidos = entidad.campos_pedidos(campos)
+    if isinstance(contenido, dict):
+        return {campo: valor for campo, valor in contenido.items() if campo in pedidos}
+    return [{campo: valor for campo, valor in fila.items() if campo in pedidos} for fila in contenido]
+
+_JOIN_ESPECIALIDAD_DOCTOR = Join("especialidad", "e", "d.id_especialidad", {"especialidad_nombre": "e.nombre"})
+
+def _join_paciente(alias: str) -> Join:
+    return Join(
+        "paciente", "p", f"{alias}.id_paciente",
+        {"paciente_nombre": "p.nombre", "paciente_apellido": "p.apellido"}
+    )
+
+def _join_doctor(alias: str) -> Join:
+    return Join(
+        "doctor", "d", f"{alias}.id_doctor",
+        {"doctor_nombre": "d.nombre", "doctor_apellido": "d.apellido"}
+    )
+
+# Claves de ordenamiento de cada listado: (columna SQL, clave en la fila)
+ORDEN_PACIENTES = (("p.apellido", "apellido"), ("p.nombre", "nombre"), ("p.id_paciente", "id_paciente"))
+ORDEN_ESPECIALIDADES = (("e.nombre", "nombre"), ("e.id_especialidad", "id_especialidad"))
+ORDEN_DOCTORES = (("d.apellido", "apellido"), ("d.nombre", "nombre"), ("d.id_doctor", "id_doctor"))
+ORDEN_CITAS = (("c.fecha_hora", "fecha_hora"), ("c.id_cita", "id_cita"))
+ORDEN_HISTORIAL = (("h.fecha", "fecha"), ("h.id_historial", "id_historial"))
+
+PACIENTE = Entidad(
+    "paciente", "p", "id_paciente",
+    ("nombre", "apellido", "fecha_nacimiento", "telefono", "email", "direccion"),
+    ORDEN_PACIENTES
+)
+ESPECIALIDAD = Entidad(
+    "especialidad", "e", "id_especialidad",
+    ("nombre", "descripcion"),
+    ORDEN_ESPECIALIDADES
+)
+DOCTOR = Entidad(
+    "doctor", "d", "id_doctor",
+    ("nombre", "apellido", "telefono", "email", "id_especialidad"),
+    ORDEN_DOCTORES,
+    joins=(_JOIN_ESPECIALIDAD_DOCTOR,)
+)
+HISTORIAL = Entidad(
+    "historial", "h", "id_historial",
+    ("fecha", "diagnostico", "tratamiento", "observaciones", "id_paciente", "id_doctor"),
+    ORDEN_HISTORIAL,
+    joins=(_join_paciente("h"), _join_doctor("h")),
+    # Del registro más reciente al más antiguo
+    descendente=True
+)
+CITA = Entidad(
+    "cita", "c", "id_cita",
+    ("fecha_hora", "motivo", "id_paciente", "id_doctor"),
+    ORDEN_CITAS,
+    joins=(_join_paciente("c"), _join_doctor("c"), _JOIN_ESPECIALIDAD_DOCTOR)
+)
+
+@lru_cache(maxsize=None)
+def _sql_update(entidad: Entidad, campos: Tuple[str, ...]) -> str:
+    """UPDATE para un conjunto de campos; se construye una vez por combinación"""
+    asignaciones = ", ".join(f"{campo} = %s" for campo in campos)
+    return f"UPDATE {entidad.tabla} SET {asignaciones} WHERE {entidad.pk} = %s"
+
+# ===========================================
+# Paginación por cursor (keyset)
+# ===========================================
+LIMITE_POR_DEFECTO = 100
+LIMITE_MAXIMO = 1000
+
+def _codificar_cursor(valores: list) -> str:
+    """Codifica los valores de las claves de ordenamiento en un cursor opaco"""
+    datos = json.dumps(valores, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip("=")
+
+def _decodificar_cursor(cursor: str, claves: int) -> list:
+    """Decodifica un cursor; lanza ValueError si no es válido"""
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, binascii.Error):
+        raise ValueError("Cursor inválido")
+    if not isinstance(valores, list) or len(valores) != claves:
+        raise ValueError("Cursor inválido")
+    # El cursor viene del cliente: solo se aceptan escalares como parámetros de la
+    # consulta (un dict o una lista llegarían sin escapar a PyMySQL)
+    if any(isinstance(valor, bool) or not isinstance(valor, (str, int, float)) for valor in valores):
+        raise ValueError("Cursor inválido")
+    return valores
+
+def _condicion_keyset(columnas: List[str], valores: list, descendente: bool = False) -> Tuple[str, list]:
+    """Condición 'filas posteriores al cursor' para un ORDER BY de varias columnas.
+
+    (a, b, c) > (x, y, z) se expande a a >= x AND (a > x OR (a = x AND b > y) OR ...)
+    para que MySQL pueda recorrer el índice por rango desde el cursor.
+    """
+    operador = "<" if descendente else ">"
+    alternativas = []
+    params = [valores[0]]
+    for i, columna in enumerate(columnas):
+        iguales = [f"{anterior} = %s" for anterior in columnas[:i]]
+        alternativas.append("(" + " AND ".join(iguales + [f"{columna} {operador} %s"]) + ")")
+        params.extend(valores[:i + 1])
+    condicion = f"{columnas[0]} {operador}= %s AND (" + " OR ".join(alternativas) + ")"
+    return condicion, params
+
+def siguiente_cursor(filas: List[dict], limite: Optional[int], orden: tuple) -> Optional[str]:
+    """Cursor de la página siguiente, o None si esta es la última"""
+    if not limite or len(filas) < limite:
+        return None
+    ultima = filas[-1]
+    return _codificar_cursor([ultima[clave] for _, clave in orden])
+
+# ===========================================
+# Inserción por lotes
+# ===========================================
+# Filas por sentencia INSERT de varias filas
+TAMANO_LOTE_INSERCION = int(os.getenv("BULK_CHUNK_SIZE", 500))
+# Máximo de registros aceptados en una sola petición de carga masiva
+MAX_REGISTROS_CARGA = 10000
+
+# ===========================================
+# Operaciones genéricas
+# ===========================================
+def _crear(entidad: Entidad, modelo) -> Optional[int]:
+    """Inserta un registro y retorna su id"""
+    return execute_query(entidad.sql_insert, tuple(getattr(modelo, columna) for columna in entidad.columnas))
+
+def _crear_lote(entidad: Entidad, modelos: Sequence, tamano_lote: Optional[int] = None,
+                errores: Optional[list] = None) -> Optional[List[Optional[int]]]:
+    """Inserta varios registros en una sola transacción; retorna sus ids en orden.
+
+    Con una lista en 'errores' los registros rechazados por la base de datos se
+    omiten (id None) y se agregan a ella como (índice, error); ver insert_many.
+    """
+    filas = [tuple(getattr(modelo, columna) for columna in entidad.columnas) for modelo in modelos]
+    return insert_many(entidad.tabla, entidad.columnas, filas, tamano_lote or TAMANO_LOTE_INSERCION, errores)
+
+def _obtener(entidad: Entidad, id_registro: int, campos: Optional[Sequence[str]] = None) -> Optional[dict]:
+    """Lee un registro por su clave primaria, con los JOIN de la entidad (o solo los de 'campos')"""
+    if not campos:
+        return execute_query_one(entidad.sql_por_id, (id_registro,))
+    sql_select, condiciones = _proyeccion(entidad, entidad.campos_pedidos(campos))
+    query = f"{sql_select} WHERE " + " AND ".join((f"{entidad.alias}.{entidad.pk} = %s",) + condiciones)
+    return execute_query_one(query, (id_registro,))
+
+def _listar(entidad: Entidad, condiciones: Sequence[str] = (), params: Sequence = (),
+            limite: Optional[int] = None, cursor: Optional[str] = None,
+            campos: Optional[Sequence[str]] = None) -> Optional[List[dict]]:
+    """Lista registros en el orden de la entidad, desde el cursor y hasta 'limite' filas.
+
+    Con 'campos' solo se leen esos campos (más la clave y las de orden) y se
+    omiten los JOIN que no aportan ninguno. Retorna None si la consulta falla.
+    """
+    condiciones = list(condiciones)
+    params = list(params)
+    query = entidad.sql_select
+    if campos:
+        query, condiciones_proyeccion = _proyeccion(entidad, entidad.campos_pedidos(campos))
+        condiciones[:0] = condiciones_proyeccion
+    columnas = [columna for columna, _ in entidad.orden]
+
+    if cursor:
+        condicion, params_cursor = _condicion_keyset(
+            columnas, _decodificar_cursor(cursor, len(columnas)), entidad.descendente
+        )
+        condiciones.append(condicion)
+        params.extend(params_cursor)
+
+    if condiciones:
+        query += " WHERE " + " AND ".join(condiciones)
+    direccion = " DESC" if entidad.descendente else ""
+    query += " ORDER BY " + ", ".join(columna + direccion for columna in columnas)
+    if limite:
+        query += " LIMIT %s"
+        params.append(limite)
+
+    return execute_query(query, tuple(params), fetch=True)
+
+def _actualizar(entidad: Entidad, id_registro: int, modelo) -> Optional[int]:
+    """Actualiza los campos no nulos del modelo; retorna las filas que coincidieron"""
+    valores = {columna: getattr(modelo, columna, None) for columna in entidad.columnas}
+    campos = tuple(columna for columna, valor in valores.items() if valor is not None)
+    if not campos:
+        raise ValueError("No se proporcionaron campos para actualizar")
+    params = tuple(valores[campo] for campo in campos) + (id_registro,)
+    return execute_update(_sql_update(entidad, campos), params)
+
+def _eliminar(entidad: Entidad, id_registro: int) -> Optional[int]:
+    """Elimina un registro; retorna las filas eliminadas"""
+    return execute_update(entidad.sql_delete, (id_registro,))
 
 # ===========================================
 # CRUD para Paciente
 # ===========================================
 def crear_paciente(paciente: PacienteCreate) -> Optional[int]:
-    query = """
-    INSERT INTO paciente (nombre, apellido, fecha_nacimiento, telefono, email, direccion)
-    VALUES (%s, %s, %s, %s, %s, %s)
+    return _crear(PACIENTE, paciente)
+
+def crear_pacientes(pacientes: List[PacienteCreate], tamano_lote: Optional[int] = None,
+                    errores: Optional[list] = None) -> Optional[List[Optional[int]]]:
+    """Inserta varios pacientes en una sola transacción; retorna sus ids en orden"""
+    return _crear_lote(PACIENTE, pacientes, tamano_lote, errores)
+
+def obtener_paciente(id_paciente: int, campos: Optional[Sequence[str]] = None) -> Optional[dict]:
+    return _obtener(PACIENTE, id_paciente, campos)
+
+def obtener_pacientes(limite: Optional[int] = None, cursor: Optional[str] = None,
+                      campos: Optional[Sequence[str]] = None) -> List[dict]:
+    return _listar(PACIENTE, limite=limite, cursor=cursor, campos=campos) or []
+
+def actualizar_paciente(id_paciente: int, paciente: PacienteUpdate) -> Optional[int]:
+    return _actualizar(PACIENTE, id_paciente, paciente)
+
+def eliminar_paciente(id_paciente: int) -> Optional[int]:
+    return _eliminar(PACIENTE, id_paciente)
+
+# Búsqueda por prefijo (autocompletado en recepción)
+LIMITE_BUSQUEDA_PACIENTES = 10
+
+def _escapar_like(texto: str) -> str:
+    """Escapa los comodines de LIKE con '!' (se usa con ESCAPE '!')"""
+    return re.sub(r"([!%_])", r"!\1", texto)
+
+# Columna de cada rama -> orden del índice que la resuelve (InnoDB agrega la clave
+# primaria a los índices secundarios), para que el LIMIT corte el recorrido sin ordenar
+_ORDEN_PREFIJO = {
+    "apellido": "apellido, nombre, id_paciente",  # idx_paciente_apellido_nombre
+    "nombre": "nombre, id_paciente",  # idx_paciente_nombre
+    "telefono": "telefono",  # UNIQUE
+    "email": "email"  # UNIQUE
+}
+
+def _prefijo_paciente(condicion: str, columna: str, limite: int) -> str:
+    """Ids de hasta 'limite' pacientes que cumplen la condición, en el orden del índice
+    de 'columna'; la tabla derivada hace que cada rama de la unión use su propio índice"""
+    return (
+        f"SELECT id_paciente FROM (SELECT id_paciente FROM paciente WHERE {condicion}"
+        f" ORDER BY {_ORDEN_PREFIJO[columna]} LIMIT {limite:d}) t"
+    )
+
+def buscar_pacientes(texto: str, limite: int = LIMITE_BUSQUEDA_PACIENTES) -> List[dict]:
+    """Pacientes cuyo apellido, nombre, teléfono o email empieza por el texto,
+    ordenados por apellido y nombre.
+
+    Con dos o más palabras también busca "apellido nombre" y "nombre apellido"
+    (p. ej. "garcia an" encuentra a Ana García). Cada columna aporta sus primeras
+    'limite' coincidencias en el orden de su índice; solo esa unión pequeña se
+    ordena por apellido y nombre.
     """
-    params = (
-        paciente.nombre, paciente.apellido, paciente.fecha_nacimiento,
-        paciente.telefono, paciente.email, paciente.direccion
+    texto = " ".join(texto.split())
+    if not texto:
+        return []
+    prefijo = _escapar_like(texto) + "%"
+    ramas = [(f"{columna} LIKE %s ESCAPE '!'", columna, [prefijo]) for columna in _ORDEN_PREFIJO]
+
+    palabras = texto.split(" ", 1)
+    if len(palabras) == 2:
+        primera, resto = (_escapar_like(palabra) + "%" for palabra in palabras)
+        ramas.append(("apellido LIKE %s ESCAPE '!' AND nombre LIKE %s ESCAPE '!'", "apellido", [primera, resto]))
+        ramas.append(("nombre LIKE %s ESCAPE '!' AND apellido LIKE %s ESCAPE '!'", "nombre", [primera, resto]))
+
+    coincidencias = " UNION ".join(
+        _prefijo_paciente(condicion, columna, limite) for condicion, columna, _ in ramas
     )
-    return execute_query(query, params)
-
-def obtener_paciente(id_paciente: int) -> Optional[dict]:
-    query = "SELECT * FROM paciente WHERE id_paciente = %s"
-    return execute_query_one(query, (id_paciente,))
-
-def obtener_pacientes() -> List[dict]:
-    query = "SELECT * FROM paciente ORDER BY apellido, nombre"
-    return execute_query(query, fetch=True) or []
-
-def actualizar_paciente(id_paciente: int, paciente: PacienteUpdate) -> bool:
-    # Construir query dinámicamente basado en campos no nulos
-    fields = []
-    params = []
-    
-    if paciente.nombre is not None:
-        fields.append("nombre = %s")
-        params.append(paciente.nombre)
-    if paciente.apellido is not None:
-        fields.append("apellido = %s")
-        params.append(paciente.apellido)
-    if paciente.fecha_nacimiento is not None:
-        fields.append("fecha_nacimiento = %s")
-        params.append(paciente.fecha_nacimiento)
-    if paciente.telefono is not None:
-        fields.append("telefono = %s")
-        params.append(paciente.telefono)
-    if paciente.email is not None:
-        fields.append("email = %s")
-        params.append(paciente.email)
-    if paciente.direccion is not None:
-        fields.append("direccion = %s")
-        params.append(paciente.direccion)
-    
-    if not fields:
-        return False
-    
-    params.append(id_paciente)
-    query = f"UPDATE paciente SET {', '.join(fields)} WHERE id_paciente = %s"
-    return execute_query(query, tuple(params)) is not None
-
-def eliminar_paciente(id_paciente: int) -> bool:
-    query = "DELETE FROM paciente WHERE id_paciente = %s"
-    return execute_query(query, (id_paciente,)) is not None
+    query = (
+        f"{PACIENTE.sql_select} JOIN ({coincidencias}) m ON m.id_paciente = p.id_paciente"
+        " ORDER BY p.apellido, p.nombre, p.id_paciente LIMIT %s"
+    )
+    params = [valor for _, _, valores in ramas for valor in valores]
+    return execute_query(query, tuple(params) + (limite,), fetch=True) or []
+
+# ===========================================
+# Caché de catálogos (especialidades y doctores)
+# ===========================================
+# Cambian pocas veces al mes: se leen de memoria y se invalidan en cada escritura.
+# Los valores en caché se comparten entre peticiones y no deben modificarse.
+_cache_catalogo = TTLCache(
+    "catalogo",
+    maxsize=int(os.getenv("CATALOG_CACHE_MAXSIZE", 512)),
+    ttl=float(os.getenv("CATALOG_CACHE_TTL", 300))
+)
+
+def invalidar_catalogo():
+    """Descarta especialidades y doctores en caché (los doctores incluyen el nombre de su especialidad)"""
+    _cache_catalogo.invalidate()
+
+def _catalogo(entidad: Entidad) -> List[dict]:
+    """Catálogo completo en el orden de la entidad; lanza Error si no se pudo leer,
+    para que un fallo no quede en la caché como un catálogo vacío"""
+    filas = _listar(entidad)
+    if filas is None:
+        raise database.Error(f"No se pudo leer el catálogo de {entidad.tabla}")
+    return filas
+
+def _doctores_en_cache() -> List[dict]:
+    return _cache_catalogo.get_or_load(("doctores",), lambda: _catalogo(DOCTOR))
 
 # ===========================================
 # CRUD para Especialidad
 # ===========================================
 def crear_especialidad(especialidad: EspecialidadCreate) -> Optional[int]:
-    query = "INSERT INTO especialidad (nombre, descripcion) VALUES (%s, %s)"
-    params = (especialidad.nombre, especialidad.descripcion)
-    return execute_query(query, params)
-
-def obtener_especialidad(id_especialidad: int) -> Optional[dict]:
-    query = "SELECT * FROM especialidad WHERE id_especialidad = %s"
-    return execute_query_one(query, (id_especialidad,))
-
-def obtener_especialidades() -> List[dict]:
-    query = "SELECT * FROM especialidad ORDER BY nombre"
-    return execute_query(query, fetch=True) or []
-
-def actualizar_especialidad(id_especialidad: int, especialidad: EspecialidadUpdate) -> bool:
-    fields = []
-    params = []
-    
-    if especialidad.nombre is not None:
-        fields.append("nombre = %s")
-        params.append(especialidad.nombre)
-    if especialidad.descripcion is not None:
-        fields.append("descripcion = %s")
-        params.append(especialidad.descripcion)
-    
-    if not fields:
-        return False
-    
-    params.append(id_especialidad)
-    query = f"UPDATE especialidad SET {', '.join(fields)} WHERE id_especialidad = %s"
-    return execute_query(query, tuple(params)) is not None
-
-def eliminar_especialidad(id_especialidad: int) -> bool:
-    query = "DELETE FROM especialidad WHERE id_especialidad = %s"
-    return execute_query(query, (id_especialidad,)) is not None
+    try:
+        return _crear(ESPECIALIDAD, especialidad)
+    finally:
+        invalidar_catalogo()
+
+# Los catálogos se guardan completos en la caché y se recortan a 'campos' al leerlos
+def obtener_especialidad(id_especialidad: int, campos: Optional[Sequence[str]] = None) -> Optional[dict]:
+    return _recortar(ESPECIALIDAD, _cache_catalogo.get_or_load(
+        ("especialidad", id_especialidad),
+        lambda: _obtener(ESPECIALIDAD, id_especialidad)
+    ), campos)
+
+def obtener_especialidades(campos: Optional[Sequence[str]] = None) -> List[dict]:
+    return _recortar(ESPECIALIDAD, _cache_catalogo.get_or_load(
+        ("especialidades",),
+        lambda: _catalogo(ESPECIALIDAD)
+    ), campos)
+
+def actualizar_especialidad(id_especialidad: int, especialidad: EspecialidadUpdate) -> Optional[int]:
+    try:
+        return _actualizar(ESPECIALIDAD, id_especialidad, especialidad)
+    finally:
+        invalidar_catalogo()
+
+def eliminar_especialidad(id_especialidad: int) -> Optional[int]:
+    try:
+        return _eliminar(ESPECIALIDAD, id_especialidad)
+    finally:
+        invalidar_catalogo()
 
 # ===========================================
 # CRUD para Doctor
 # ===========================================
 def crear_doctor(doctor: DoctorCreate) -> Optional[int]:
-    query = """
-    INSERT INTO doctor (nombre, apellido, telefono, email, id_especialidad)
-    VALUES (%s, %s, %s, %s, %s)
-    """
-    params = (doctor.nombre, doctor.apellido, doctor.telefono, doctor.email, doctor.id_especialidad)
-    return execute_query(query, params)
-
-def obtener_doctor(id_doctor: int) -> Optional[dict]:
-    query = """
-    SELECT d.*, e.nombre as especialidad_nombre 
-    FROM doctor d 
-    JOIN especialidad e ON d.id_especialidad = e.id_especialidad 
-    WHERE d.id_doctor = %s
-    """
-    return execute_query_one(query, (id_doctor,))
-
-def obtener_doctores() -> List[dict]:
-    query = """
-    SELECT d.*, e.nombre as especialidad_nombre 
-    FROM doctor d 
-    JOIN especialidad e ON d.id_especialidad = e.id_especialidad 
-    ORDER BY d.apellido, d.nombre
-    """
-    return execute_query(query, fetch=True) or []
-
-def obtener_doctores_por_especialidad(id_especialidad: int) -> List[dict]:
-    query = """
-    SELECT d.*, e.nombre as especialidad_nombre 
-    FROM doctor d 
-    JOIN especialidad e ON d.id_especialidad = e.id_especialidad 
-    WHERE d.id_especialidad = %s
-    ORDER BY d.apellido, d.nombre
-    """
-    return execute_query(query, (id_especialidad,), fetch=True) or []
-
-def actualizar_doctor(id_doctor: int, doctor: DoctorUpdate) -> bool:
-    fields = []
-    params = []
-    
-    if doctor.nombre is not None:
-        fields.append("nombre = %s")
-        params.append(doctor.nombre)
-    if doctor.apellido is not None:
-        fields.append("apellido = %s")
-        params.append(doctor.apellido)
-    if doctor.telefono is not None:
-        fields.append("telefono = %s")
-        params.append(doctor.telefono)
-    if doctor.email is not None:
-        fields.append("email = %s")
-        params.append(doctor.email)
-    if doctor.id_especialidad is not None:
-        fields.append("id_especialidad = %s")
-        params.append(doctor.id_especialidad)
-    
-    if not fields:
-        return False
-    
-    params.append(id_doctor)
-    query = f"UPDATE doctor SET {', '.join(fields)} WHERE id_doctor = %s"
-    return execute_query(query, tuple(params)) is not None
-
-def eliminar_doctor(id_doctor: int) -> bool:
-    query = "DELETE FROM doctor WHERE id_doctor = %s"
-    return execute_query(query, (id_doctor,)) is not None
+    try:
+        return _crear(DOCTOR, doctor)
+    finally:
+        invalidar_catalogo()
+
+def obtener_doctor(id_doctor: int, campos: Optional[Sequence[str]] = None) -> Optional[dict]:
+    return _recortar(DOCTOR, _cache_catalogo.get_or_load(
+        ("doctor", id_doctor),
+        lambda: _obtener(DOCTOR, id_doctor)
+    ), campos)
+
+# Solo se guarda el catálogo completo: la primera página se recorta de él y las
+# siguientes se leen de la base, para que los valores que elige el cliente
+# (cursor, límite, especialidad) no creen entradas nuevas en la caché
+def obtener_doctores(limite: Optional[int] = None, cursor: Optional[str] = None,
+                     campos: Optional[Sequence[str]] = None) -> List[dict]:
+    if cursor:
+        return _listar(DOCTOR, limite=limite, cursor=cursor, campos=campos) or []
+    doctores = _doctores_en_cache()
+    return _recortar(DOCTOR, doctores[:limite] if limite else doctores, campos)
+
+def obtener_doctores_por_especialidad(id_especialidad: int, limite: Optional[int] = None,
+                                      cursor: Optional[str] = None,
+                                      campos: Optional[Sequence[str]] = None) -> List[dict]:
+    if cursor:
+        return _listar(DOCTOR, ["d.id_especialidad = %s"], [id_especialidad], limite, cursor, campos) or []
+    doctores = [doctor for doctor in _doctores_en_cache() if doctor["id_especialidad"] == id_especialidad]
+    return _recortar(DOCTOR, doctores[:limite] if limite else doctores, campos)
+
+def actualizar_doctor(id_doctor: int, doctor: DoctorUpdate) -> Optional[int]:
+    try:
+        return _actualizar(DOCTOR, id_doctor, doctor)
+    finally:
+        invalidar_catalogo()
+
+def eliminar_doctor(id_doctor: int) -> Optional[int]:
+    try:
+        return _eliminar(DOCTOR, id_doctor)
+    finally:
+        invalidar_catalogo()
 
 # ===========================================
 # CRUD para Historial
 # ===========================================
 def crear_historial(historial: HistorialCreate) -> Optional[int]:
-    query = """
-    INSERT INTO historial (fecha, diagnostico, tratamiento, observaciones, id_paciente, id_doctor)
-    VALUES (%s, %s, %s, %s, %s, %s)
+    return _crear(HISTORIAL, historial)
+
+def obtener_historial(id_historial: int, campos: Optional[Sequence[str]] = None) -> Optional[dict]:
+    return _obtener(HISTORIAL, id_historial, campos)
+
+def obtener_historial_paciente(id_paciente: int, limite: Optional[int] = None,
+                               cursor: Optional[str] = None,
+                               campos: Optional[Sequence[str]] = None) -> List[dict]:
+    return _listar(HISTORIAL, ["h.id_paciente = %s"], [id_paciente], limite, cursor, campos) or []
+
+def actualizar_historial(id_historial: int, historial: HistorialUpdate) -> Optional[int]:
+    return _actualizar(HISTORIAL, id_historial, historial)
+
+def eliminar_historial(id_historial: int) -> Optional[int]:
+    return _eliminar(HISTORIAL, id_historial)
+
+# ===========================================
+# Búsqueda en el historial
+# ===========================================
+# Palabras con menos letras no se indexan (innodb_ft_min_token_size = 3)
+MIN_LETRAS_TERMINO = 3
+# Los resultados se ordenan por relevancia: hay que calcularla para todas las
+# coincidencias, así que la paginación es por desplazamiento y se acota
+MAX_RESULTADOS_BUSQUEDA = 1000
+
+_COLUMNAS_TEXTO_HISTORIAL = ("h.diagnostico", "h.tratamiento", "h.observaciones")
+_SQL_RELEVANCIA = f"MATCH({', '.join(_COLUMNAS_TEXTO_HISTORIAL)}) AGAINST (%s IN BOOLEAN MODE)"
+
+def _terminos_busqueda(texto: str) -> List[str]:
+    """Palabras buscables del texto (sin operadores de la búsqueda booleana)"""
+    return [termino for termino in re.findall(r"\w+", texto) if len(termino) >= MIN_LETRAS_TERMINO]
+
+def _desplazamiento(cursor: Optional[str]) -> int:
+    """Resultados ya entregados según el cursor de una búsqueda"""
+    if not cursor:
+        return 0
+    desplazamiento = _decodificar_cursor(cursor, 1)[0]
+    if not isinstance(desplazamiento, int) or desplazamiento < 0:
+        raise ValueError("Cursor inválido")
+    return desplazamiento
+
+def buscar_historial(texto: str, id_paciente: Optional[int] = None, id_doctor: Optional[int] = None,
+                     desde: Optional[date] = None, hasta: Optional[date] = None,
+                     limite: int = LIMITE_POR_DEFECTO, cursor: Optional[str] = None) -> List[dict]:
+    """Busca en diagnóstico, tratamiento y observaciones, de más a menos relevante.
+
+    Cada palabra es obligatoria y se busca como prefijo ("hipertens" encuentra
+    "hipertensión") con el índice FULLTEXT. En SQLite, sin ese índice, se usa
+    LIKE y el campo relevancia es 0. Lanza ValueError si no hay palabras buscables.
     """
-    params = (
-        historial.fecha, historial.diagnostico, historial.tratamiento,
-        historial.observaciones, historial.id_paciente, historial.id_doctor
+    terminos = _terminos_busqueda(texto)
+    if not terminos:
+        raise ValueError(f"La búsqueda debe incluir al menos una palabra de {MIN_LETRAS_TERMINO} letras")
+    desplazamiento = _desplazamiento(cursor)
+    if desplazamiento + limite > MAX_RESULTADOS_BUSQUEDA:
+        raise ValueError(f"La búsqueda entrega como máximo {MAX_RESULTADOS_BUSQUEDA} resultados; agrega filtros")
+
+    if database.DB_BACKEND == "mysql":
+        expresion = " ".join(f"+{termino}*" for termino in terminos)
+        relevancia = _SQL_RELEVANCIA
+        condiciones = [_SQL_RELEVANCIA]
+        params = [expresion, expresion]
+    else:
+        relevancia = "0"
+        condiciones = []
+        params = []
+        for termino in terminos:
+            patron = "%" + _escapar_like(termino) + "%"
+            condiciones.append(
+                "(" + " OR ".join(f"{columna} LIKE %s ESCAPE '!'" for columna in _COLUMNAS_TEXTO_HISTORIAL) + ")"
+            )
+            params.extend([patron] * len(_COLUMNAS_TEXTO_HISTORIAL))
+
+    for condicion, valor in (("h.id_paciente = %s", id_paciente), ("h.id_doctor = %s", id_doctor),
+                             ("h.fecha >= %s", desde), ("h.fecha <= %s", hasta)):
+        if valor is not None:
+            condiciones.append(condicion)
+            params.append(valor)
+
+    query = (
+        f"SELECT {HISTORIAL.sql_columnas}, {relevancia} as relevancia{HISTORIAL.sql_from}"
+        f" WHERE {' AND '.join(condiciones)}"
+        " ORDER BY relevancia DESC, h.id_historial DESC LIMIT %s OFFSET %s"
     )
-    return execute_query(query, params)
-
-def obtener_historial(id_historial: int) -> Optional[dict]:
-    query = """
-    SELECT h.*, p.nombre as paciente_nombre, p.apellido as paciente_apellido,
-           d.nombre as doctor_nombre, d.apellido as doctor_apellido
-    FROM historial h
-    JOIN paciente p ON h.id_paciente = p.id_paciente
-    JOIN doctor d ON h.id_doctor = d.id_doctor
-    WHERE h.id_historial = %s
-    """
-    return execute_query_one(query, (id_historial,))
-
-def obtener_historial_paciente(id_paciente: int) -> List[dict]:
-    query = """
-    SELECT h.*, p.nombre as paciente_nombre, p.apellido as paciente_apellido,
-           d.nombre as doctor_nombre, d.apellido as doctor_apellido
-    FROM historial h
-    JOIN paciente p ON h.id_paciente = p.id_paciente
-    JOIN doctor d ON h.id_doctor = d.id_doctor
-    WHERE h.id_paciente = %s
-    ORDER BY h.fecha DESC
-    """
-    return execute_query(query, (id_paciente,), fetch=True) or []
-
-def actualizar_historial(id_historial: int, historial: HistorialUpdate) -> bool:
-    fields = []
-    params = []
-    
-    if historial.fecha is not None:
-        fields.append("fecha = %s")
-        params.append(historial.fecha)
-    if historial.diagnostico is not None:
-        fields.append("diagnostico = %s")
-        params.append(historial.diagnostico)
-    if historial.tratamiento is not None:
-        fields.append("tratamiento = %s")
-        params.append(historial.tratamiento)
-    if historial.observaciones is not None:
-        fields.append("observaciones = %s")
-        params.append(historial.observaciones)
-    if historial.id_doctor is not None:
-        fields.append("id_doctor = %s")
-        params.append(historial.id_doctor)
-    
-    if not fields:
-        return False
-    
-    params.append(id_historial)
-    query = f"UPDATE historial SET {', '.join(fields)} WHERE id_historial = %s"
-    return execute_query(query, tuple(params)) is not None
-
-def eliminar_historial(id_historial: int) -> bool:
-    query = "DELETE FROM historial WHERE id_historial = %s"
-    return execute_query(query, (id_historial,)) is not None
+    return execute_query(query, tuple(params) + (limite, desplazamiento), fetch=True) or []
+
+def siguiente_cursor_busqueda(filas: List[dict], limite: int, cursor: Optional[str]) -> Optional[str]:
+    """Cursor de la página siguiente de una búsqueda, o None si esta es la última"""
+    if len(filas) < limite:
+        return None
+    return _codificar_cursor([_desplazamiento(cursor) + limite])
 
 # ===========================================
 # CRUD para Cita
 # ===========================================
 def crear_cita(cita: CitaCreate) -> Optional[int]:
-    query = """
-    INSERT INTO cita (fecha_hora, motivo, id_paciente, id_doctor)
-    VALUES (%s, %s, %s, %s)
-    """
-    params = (cita.fecha_hora, cita.motivo, cita.id_paciente, cita.id_doctor)
-    return execute_query(query, params)
-
-def obtener_cita(id_cita: int) -> Optional[dict]:
-    query = """
-    SELECT c.*, p.nombre as paciente_nombre, p.apellido as paciente_apellido,
-           d.nombre as doctor_nombre, d.apellido as doctor_apellido,
-           e.nombre as especialidad_nombre
-    FROM cita c
-    JOIN paciente p ON c.id_paciente = p.id_paciente
-    JOIN doctor d ON c.id_doctor = d.id_doctor
-    JOIN especialidad e ON d.id_especialidad = e.id_especialidad
-    WHERE c.id_cita = %s
-    """
-    return execute_query_one(query, (id_cita,))
-
-def obtener_citas() -> List[dict]:
-    query = """
-    SELECT c.*, p.nombre as paciente_nombre, p.apellido as paciente_apellido,
-           d.nombre as doctor_nombre, d.apellido as doctor_apellido,
-           e.nombre as especialidad_nombre
-    FROM cita c
-    JOIN paciente p ON c.id_paciente = p.id_paciente
-    JOIN doctor d ON c.id_doctor = d.id_doctor
-    JOIN especialidad e ON d.id_especialidad = e.id_especialidad
-    ORDER BY c.fecha_hora
-    """
-    return execute_query(query, fetch=True) or []
-
-def obtener_citas_paciente(id_paciente: int) -> List[dict]:
-    query = """
-    SELECT c.*, p.nombre as paciente_nombre, p.apellido as paciente_apellido,
-           d.nombre as doctor_nombre, d.apellido as doctor_apellido,
-           e.nombre as especialidad_nombre
-    FROM cita c
-    JOIN paciente p ON c.id_paciente = p.id_paciente
-    JOIN doctor d ON c.id_doctor = d.id_doctor
-    JOIN especialidad e ON d.id_especialidad = e.id_especialidad
-    WHERE c.id_paciente = %s
-    ORDER BY c.fecha_hora
+    """Reserva una cita en un único INSERT.
+
+    La restricción UNIQUE (id_doctor, fecha_hora) hace la reserva atómica:
+    si el horario ya está tomado lanza DuplicateKeyError, sin consulta previa.
     """
-    return execute_query(query, (id_paciente,), fetch=True) or []
-
-def obtener_citas_doctor(id_doctor: int) -> List[dict]:
-    query = """
-    SELECT c.*, p.nombre as paciente_nombre, p.apellido as paciente_apellido,
-           d.nombre as doctor_nombre, d.apellido as doctor_apellido,
-           e.nombre as especialidad_nombre
-    FROM cita c
-    JOIN paciente p ON c.id_paciente = p.id_paciente
-    JOIN doctor d ON c.id_doctor = d.id_doctor
-    JOIN especialidad e ON d.id_especialidad = e.id_especialidad
-    WHERE c.id_doctor = %s
-    ORDER BY c.fecha_hora
+    return _crear(CITA, cita)
+
+def crear_citas(citas: List[CitaCreate], tamano_lote: Optional[int] = None,
+                errores: Optional[list] = None) -> Optional[List[Optional[int]]]:
+    """Inserta varias citas en una sola transacción; retorna sus ids en orden"""
+    return _crear_lote(CITA, citas, tamano_lote, errores)
+
+def obtener_cita(id_cita: int, campos: Optional[Sequence[str]] = None) -> Optional[dict]:
+    return _obtener(CITA, id_cita, campos)
+
+def obtener_citas(limite: Optional[int] = None, cursor: Optional[str] = None,
+                  campos: Optional[Sequence[str]] = None) -> List[dict]:
+    return _listar(CITA, limite=limite, cursor=cursor, campos=campos) or []
+
+MOMENTOS_CITA = ("pasadas", "proximas")
+
+def _filtro_citas(columna: str, valor: int, desde: Optional[date], hasta: Optional[date],
+                  momento: Optional[str]) -> Tuple[List[str], list]:
+    """Condiciones de las citas de un paciente o doctor dentro de un rango de fechas.
+
+    'hasta' es inclusivo y se convierte en el límite abierto del día siguiente;
+    con la igualdad sobre la columna, todo es un rango sobre el índice
+    (columna, fecha_hora). momento compara con la hora actual del servidor.
     """
-    return execute_query(query, (id_doctor,), fetch=True) or []
-
-def actualizar_cita(id_cita: int, cita: CitaUpdate) -> bool:
-    fields = []
-    params = []
-    
-    if cita.fecha_hora is not None:
-        fields.append("fecha_hora = %s")
-        params.append(cita.fecha_hora)
-    if cita.motivo is not None:
-        fields.append("motivo = %s")
-        params.append(cita.motivo)
-    if cita.id_doctor is not None:
-        fields.append("id_doctor = %s")
-        params.append(cita.id_doctor)
-    
-    if not fields:
-        return False
-    
-    params.append(id_cita)
-    query = f"UPDATE cita SET {', '.join(fields)} WHERE id_cita = %s"
-    return execute_query(query, tuple(params)) is not None
-
-def eliminar_cita(id_cita: int) -> bool:
-    query = "DELETE FROM cita WHERE id_cita = %s"
-    return execute_query(query, (id_cita,)) is not None
+    condiciones = [f"{columna} = %s"]
+    params: list = [valor]
+    if desde:
+        condiciones.append("c.fecha_hora >= %s")
+        params.append(datetime.combine(desde, time.min))
+    if hasta:
+        condiciones.append("c.fecha_hora < %s")
+        params.append(datetime.combine(hasta + timedelta(days=1), time.min))
+    if momento:
+        if momento not in MOMENTOS_CITA:
+            raise ValueError(f"momento debe ser uno de: {', '.join(MOMENTOS_CITA)}")
+        condiciones.append("c.fecha_hora < %s" if momento == "pasadas" else "c.fecha_hora >= %s")
+        params.append(datetime.now().replace(microsecond=0))
+    return condiciones, params
+
+def obtener_citas_paciente(id_paciente: int, desde: Optional[date] = None, hasta: Optional[date] = None,
+                           momento: Optional[str] = None, limite: Optional[int] = None,
+                           cursor: Optional[str] = None, campos: Optional[Sequence[str]] = None) -> List[dict]:
+    condiciones, params = _filtro_citas("c.id_paciente", id_paciente, desde, hasta, momento)
+    return _listar(CITA, condiciones, params, limite, cursor, campos) or []
+
+def obtener_citas_doctor(id_doctor: int, desde: Optional[date] = None, hasta: Optional[date] = None,
+                         momento: Optional[str] = None, limite: Optional[int] = None,
+                         cursor: Optional[str] = None, campos: Optional[Sequence[str]] = None) -> List[dict]:
+    condiciones, params = _filtro_citas("c.id_doctor", id_doctor, desde, hasta, momento)
+    return _listar(CITA, condiciones, params, limite, cursor, campos) or []
+
+def actualizar_cita(id_cita: int, cita: CitaUpdate) -> Optional[int]:
+    return _actualizar(CITA, id_cita, cita)
+
+def eliminar_cita(id_cita: int) -> Optional[int]:
+    return _eliminar(CITA, id_cita)
+
+# ===========================================
+# Exportación
+# ===========================================
+TAMANO_BLOQUE_EXPORTACION = int(os.getenv("EXPORT_CHUNK_SIZE", 1000))
+
+def exportar_citas():
+    """Recorre todas las citas por bloques de filas, sin cargarlas en memoria"""
+    return stream_query(CITA.sql_select + " ORDER BY c.id_cita", chunk_size=TAMANO_BLOQUE_EXPORTACION)
+
+def exportar_historial():
+    """Recorre todo el historial por bloques de filas, sin cargarlo en memoria"""
+    return stream_query(HISTORIAL.sql_select + " ORDER BY h.id_historial", chunk_size=TAMANO_BLOQUE_EXPORTACION)
 
 # ===========================================
 # Funciones de disponibilidad
 # ===========================================
+HORARIOS_BASE = [
+    "08:00", "08:30", "09:00", "09:30", "10:00", "10:30", "11:00", "11:30",
+    "14:00", "14:30", "15:00", "15:30", "16:00", "16:30", "17:00", "17:30"
+]
+
+# Posición de cada horario base en los bitmaps de disponibilidad
+_INDICE_HORARIO = {datetime.strptime(hora, "%H:%M").time(): i for i, hora in enumerate(HORARIOS_BASE)}
+_MASCARA_COMPLETA = (1 << len(HORARIOS_BASE)) - 1
+
+# Máximo de días que se pueden consultar en el calendario de disponibilidad
+MAX_DIAS_CALENDARIO = 62
+
+# Comparar fecha_hora directamente (sin DATE()/TIME()) permite usar el índice (id_doctor, fecha_hora)
+SQL_VERIFICAR_DISPONIBILIDAD = """
+SELECT COUNT(*) as count FROM cita
+WHERE id_doctor = %s AND fecha_hora = %s
+"""
+
 def verificar_disponibilidad(fecha: date, id_doctor: int, hora: str) -> bool:
     """Verifica si un doctor está disponible en una fecha y hora específica"""
     fecha_hora = datetime.combine(fecha, datetime.strptime(hora, "%H:%M").time())
-    query = """
-    SELECT COUNT(*) as count FROM cita 
-    WHERE id_doctor = %s AND DATE(fecha_hora) = %s AND TIME(fecha_hora) = %s
-    """
-    result = execute_query_one(query, (id_doctor, fecha, hora))
+    result = execute_query_one(SQL_VERIFICAR_DISPONIBILIDAD, (id_doctor, fecha_hora))
     return result and result['count'] == 0
 
-def obtener_horarios_disponibles(fecha: date, id_doctor: Optional[int] = None, id_especialidad: Optional[int] = None) -> List[dict]:
-    """Obtiene horarios disponibles para una fecha específica"""
-    horarios_base = [
-        "08:00", "08:30", "09:00", "09:30", "10:00", "10:30", "11:00", "11:30",
-        "14:00", "14:30", "15:00", "15:30", "16:00", "16:30", "17:00", "17:30"
-    ]
-    
+def _mascaras_ocupadas(desde: datetime, hasta: datetime, id_doctor: Optional[int] = None,
+                       id_especialidad: Optional[int] = None) -> Optional[Dict[Tuple[int, date], int]]:
+    """Obtiene en una sola consulta los horarios ocupados en [desde, hasta).
+
+    Retorna un bitmap por (doctor, día) donde el bit i indica que HORARIOS_BASE[i]
+    está ocupado, o None si la consulta falla.
+    """
+    query = "SELECT c.id_doctor, c.fecha_hora FROM cita c"
+    conditions = ["c.fecha_hora >= %s", "c.fecha_hora < %s"]
+    params = [desde, hasta]
+
     if id_doctor:
-        # Filtrar por doctor específico
-        doctores = [obtener_doctor(id_doctor)] if obtener_doctor(id_doctor) else []
+        conditions.append("c.id_doctor = %s")
+        params.append(id_doctor)
     elif id_especialidad:
-        # Filtrar por especialidad
-        doctores = obtener_doctores_por_especialidad(id_especialidad)
-    else:
-        # Todos los doctores
-        doctores = obtener_doctores()
-    
+        query += " JOIN doctor d ON c.id_doctor = d.id_doctor"
+        conditions.append("d.id_especialidad = %s")
+        params.append(id_especialidad)
+
+    query += " WHERE " + " AND ".join(conditions)
+    filas = execute_query(query, tuple(params), fetch=True)
+    if filas is None:
+        return None
+
+    ocupados = {}
+    for fila in filas:
+        indice = _INDICE_HORARIO.get(fila['fecha_hora'].time())
+        if indice is None:
+            # Citas fuera de los horarios base no bloquean ningún horario
+            continue
+        clave = (fila['id_doctor'], fila['fecha_hora'].date())
+        ocupados[clave] = ocupados.get(clave, 0) | (1 << indice)
+    return ocupados
+
+def _horarios_de_mascara(mascara: int) -> List[str]:
+    """Convierte un bitmap de horarios libres en la lista de horas"""
+    return [hora for i, hora in enumerate(HORARIOS_BASE) if mascara >> i & 1]
+
+def _doctores_disponibilidad(id_doctor: Optional[int] = None, id_especialidad: Optional[int] = None) -> List[dict]:
+    """Doctores sobre los que se calcula la disponibilidad"""
+    if id_doctor:
+        doctor = obtener_doctor(id_doctor)
+        return [doctor] if doctor else []
+    if id_especialidad:
+        return obtener_doctores_por_especialidad(id_especialidad)
+    return obtener_doctores()
+
+def obtener_horarios_disponibles(fecha: date, id_doctor: Optional[int] = None, id_especialidad: Optional[int] = None) -> List[dict]:
+    """Obtiene horarios disponibles para una fecha específica"""
+    doctores = _doctores_disponibilidad(id_doctor, id_especialidad)
+    if not doctores:
+        return []
+
+    desde = datetime.combine(fecha, time.min)
+    ocupados = _mascaras_ocupadas(desde, desde + timedelta(days=1), id_doctor, id_especialidad)
+    if ocupados is None:
+        return []
+
     disponibilidad = []
-    
+
     for doctor in doctores:
-        horarios_disponibles = []
-        for hora in horarios_base:
-            if verificar_disponibilidad(fecha, doctor['id_doctor'], hora):
-                horarios_disponibles.append(hora)
-        
-        if horarios_disponibles:
+        libres = _MASCARA_COMPLETA & ~ocupados.get((doctor['id_doctor'], fecha), 0)
+        if libres:
             disponibilidad.append({
                 'doctor_id': doctor['id_doctor'],
                 'doctor_nombre': f"{doctor['nombre']} {doctor['apellido']}",
                 'especialidad': doctor.get('especialidad_nombre', ''),
-                'horarios_disponibles': horarios_disponibles
+                'horarios_disponibles': _horarios_de_mascara(libres)
             })
-    
+
     return disponibilidad
+
+def obtener_calendario_disponibilidad(fecha_desde: date, fecha_hasta: date, id_doctor: Optional[int] = None,
+                                      id_especialidad: Optional[int] = None, compacto: bool = False) -> Optional[dict]:
+    """Obtiene la disponibilidad por día y doctor para el rango [fecha_desde, fecha_hasta].
+
+    Con compacto=True cada doctor trae una máscara de horarios libres por día
+    (bit i = HORARIOS_BASE[i]) en lugar de las listas de horas.
+    """
+    dias = [fecha_desde + timedelta(days=i) for i in range((fecha_hasta - fecha_desde).days + 1)]
+    calendario = {
+        'fecha_desde': fecha_desde,
+        'fecha_hasta': fecha_hasta,
+        'horarios': HORARIOS_BASE,
+        'doctores': []
+    }
+
+    doctores = _doctores_disponibilidad(id_doctor, id_especialidad)
+    if not doctores:
+        return calendario
+
+    ocupados = _mascaras_ocupadas(
+        datetime.combine(fecha_desde, time.min),
+        datetime.combine(fecha_hasta + timedelta(days=1), time.min),
+        id_doctor, id_especialidad
+    )
+    if ocupados is None:
+        return None
+
+    for doctor in doctores:
+        libres = [_MASCARA_COMPLETA & ~ocupados.get((doctor['id_doctor'], dia), 0) for dia in dias]
+        entrada = {
+            'doctor_id': doctor['id_doctor'],
+            'doctor_nombre': f"{doctor['nombre']} {doctor['apellido']}",
+            'especialidad': doctor.get('especialidad_nombre', '')
+        }
+        if compacto:
+            entrada['mascaras'] = libres
+        else:
+            entrada['dias'] = {
+                dia.isoformat(): _horarios_de_mascara(mascara) for dia, mascara in zip(dias, libres)
+            }
+        calendario['doctores'].append(entrada)
+
+    return calendario
@@ -1,7 +1,28 @@
 import pymysql
 from pymysql import Error
-from typing import Optional
+from pymysql.constants import CLIENT, ER
+from typing import Callable, List, Optional, Sequence
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+import time
 import os
+import sys
+
+from migrations import MIGRACIONES, SCHEMA_VERSION_TABLE, ULTIMA_VERSION, MigracionPospuesta
+
+logger = logging.getLogger(__name__)
+
+# Motor de base de datos: "mysql" o "sqlite" (local, sin servidor: desarrollo, CI y benchmarks)
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql").lower()
+
+# Archivo de la base SQLite; ":memory:" la mantiene en la memoria del proceso
+SQLITE_PATH = os.getenv("DB_SQLITE_PATH", ":memory:")
 
 # Configuración de la base de datos
 DB_CONFIG = {
@@ -12,249 +33,738 @@ DB_CONFIG = {
     "database": os.getenv("DB_DATABASE", "railway")
 }
 
+# Configuración del pool de conexiones
+POOL_CONFIG = {
+    "min_size": int(os.getenv("DB_POOL_MIN_SIZE", 2)),
+    "max_size": int(os.getenv("DB_POOL_MAX_SIZE", 10)),
+    "idle_timeout": float(os.getenv("DB_POOL_IDLE_TIMEOUT", 300)),
+    "acquire_timeout": float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", 10)),
+    "health_check_interval": float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", 30))
+}
+
+# Segundos que un proceso espera el lock de inicialización mientras otro la ejecuta
+BOOTSTRAP_LOCK_TIMEOUT = int(os.getenv("DB_BOOTSTRAP_LOCK_TIMEOUT", 120))
+
+# Las consultas que tarden al menos estos milisegundos se registran como lentas (0 = desactivado)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 500))
+
+# Hilos dedicados a las llamadas bloqueantes de PyMySQL. Por defecto igual al
+# máximo del pool: más hilos solo quedarían esperando una conexión libre.
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", POOL_CONFIG["max_size"]))
+
+class DuplicateKeyError(Exception):
+    """Una escritura violó una restricción UNIQUE (p. ej. un horario ya reservado)"""
+
+def _raise_if_duplicate(error: Error):
+    """Convierte un error de clave duplicada en DuplicateKeyError"""
+    if isinstance(error, pymysql.IntegrityError) and error.args and error.args[0] == ER.DUP_ENTRY:
+        raise DuplicateKeyError(error.args[1] if len(error.args) > 1 else str(error)) from error
+
+def describe_integrity_error(error: Error) -> str:
+    """Motivo legible por el que la base de datos rechazó una fila"""
+    code = error.args[0] if error.args else None
+    if code == ER.DUP_ENTRY:
+        return "El registro entra en conflicto con uno existente"
+    if code in (ER.NO_REFERENCED_ROW, ER.NO_REFERENCED_ROW_2):
+        return "El registro hace referencia a otro que no existe"
+    if code == ER.BAD_NULL_ERROR:
+        return "Falta un campo obligatorio"
+    return "La base de datos rechazó el registro"
+
+# ===========================================
+# Conteo e instrumentación de consultas
+# ===========================================
+class QueryStats:
+    """Consultas ejecutadas, tiempo en la base de datos y tiempo obteniendo
+    conexiones durante un bloque (p. ej. una petición).
+
+    Con detail=True cuenta además las consultas por función de crud.
+    """
+
+    def __init__(self, detail: bool = False):
+        self.queries = 0
+        self.db_time = 0.0
+        self.connections = 0
+        self.connect_time = 0.0
+        self.by_function = {} if detail else None  # función -> [consultas, segundos]
+        self._lock = threading.Lock()
+
+    def record(self, elapsed: float, function: Optional[str] = None):
+        with self._lock:
+            self.queries += 1
+            self.db_time += elapsed
+            if self.by_function is not None:
+                entry = self.by_function.setdefault(function or calling_function(), [0, 0.0])
+                entry[0] += 1
+                entry[1] += elapsed
+
+    def record_connect(self, elapsed: float):
+        with self._lock:
+            self.connections += 1
+            self.connect_time += elapsed
+
+# run_db copia el contexto al hilo del executor, así que las consultas de una
+# petición se suman al QueryStats de esa petición
+_query_stats: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar("query_stats", default=None)
+
+@contextmanager
+def track_queries(detail: bool = False):
+    """Cuenta las consultas ejecutadas dentro del bloque"""
+    stats = QueryStats(detail)
+    token = _query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _query_stats.reset(token)
+
+# Observadores de la capa de datos (p. ej. métricas):
+#   query_listener(query, elapsed, failed) tras cada sentencia
+#   acquire_listener(elapsed) tras obtener una conexión del pool
+_query_listeners: List[Callable] = []
+_acquire_listeners: List[Callable] = []
+
+def add_query_listener(listener: Callable):
+    _query_listeners.append(listener)
+
+def add_acquire_listener(listener: Callable):
+    _acquire_listeners.append(listener)
+
+def calling_function(default: str = "desconocida") -> str:
+    """Primera función pública de crud en la pila de llamadas (p. ej. 'obtener_citas')"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        name = frame.f_code.co_name
+        if frame.f_globals.get("__name__") == "crud" and not name.startswith(("_", "<")):
+            return name
+        frame = frame.f_back
+    return default
+
+def _execute(cursor, query: str, params=None, many: bool = False):
+    """Ejecuta una sentencia registrándola en el QueryStats activo y en los observadores"""
+    started = time.perf_counter()
+    failed = True
+    try:
+        result = cursor.executemany(query, params) if many else cursor.execute(query, params)
+        failed = False
+        return result
+    finally:
+        elapsed = time.perf_counter() - started
+        function = None
+        if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+            function = calling_function()
+            # Solo la plantilla SQL: los parámetros pueden contener datos de pacientes
+            logger.warning(
+                "Consulta lenta (%.1f ms) en %s", elapsed * 1000, function,
+                extra={"duration_ms": round(elapsed * 1000, 1), "function": function, "sql": " ".join(query.split())}
+            )
+        stats = _query_stats.get()
+        if stats is not None:
+            stats.record(elapsed, function)
+        for listener in _query_listeners:
+            listener(query, elapsed, failed)
+
+# ===========================================
+# Pool de conexiones
+# ===========================================
+def _connect_mysql(**config):
+    # FOUND_ROWS: un UPDATE reporta las filas que coincidieron aunque no cambien
+    # sus valores, para que 0 signifique "no existe"
+    return pymysql.connect(**config, autocommit=True, client_flag=CLIENT.FOUND_ROWS)
+
+class ConnectionPool:
+    """Pool de conexiones PyMySQL reutilizables, seguro para uso entre hilos.
+
+    Las conexiones se abren en modo autocommit para que una conexión
+    reutilizada no conserve la instantánea de una transacción anterior.
+    """
+
+    def __init__(self, config: dict, min_size: int = 2, max_size: int = 10,
+                 idle_timeout: float = 300, acquire_timeout: float = 10,
+                 health_check_interval: float = 30, connect: Callable = _connect_mysql):
+        self.config = config
+        self.connect = connect  # connect(**config) abre una conexión nueva
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max(1, max_size)
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+
+        self._idle = deque()  # (conexión, instante en que quedó libre)
+        self._size = 0  # conexiones abiertas: ociosas + prestadas
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats = {
+            "created": 0,
+            "closed": 0,
+            "acquired": 0,
+            "reused": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "health_check_failures": 0,
+            "connect_errors": 0,
+            "wait_time": 0.0
+        }
+
+    def _connect(self):
+        return self.connect(**self.config)
+
+    def _close_connection(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _purge_idle(self) -> list:
+        """Retira las conexiones ociosas vencidas sin bajar de min_size (con el lock tomado)"""
+        expired = []
+        now = time.monotonic()
+        # Las conexiones más antiguas están al inicio de la cola
+        while self._idle and self._size > self.min_size:
+            connection, released_at = self._idle[0]
+            if now - released_at < self.idle_timeout:
+                break
+            self._idle.popleft()
+            self._size -= 1
+            self._stats["closed"] += 1
+            expired.append(connection)
+        return expired
+
+    def _is_healthy(self, connection, released_at: float) -> bool:
+        """Verifica la conexión si lleva ociosa más de health_check_interval"""
+        if time.monotonic() - released_at < self.health_check_interval:
+            return True
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Error:
+            return False
+
+    def acquire(self):
+        """Toma una conexión del pool, abriendo una nueva si hay capacidad"""
+        started = time.monotonic()
+        deadline = started + self.acquire_timeout
+
+        while True:
+            connection = None
+            released_at = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise Error("El pool de conexiones está cerrado")
+                    expired = self._purge_idle()
+                    if self._idle:
+                        # LIFO: la conexión usada más recientemente sigue caliente
+                        connection, released_at = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise Error("Tiempo de espera agotado obteniendo una conexión del pool")
+                    self._stats["waits"] += 1
+                    self._cond.wait(remaining)
+
+            for stale in expired:
+                self._close_connection(stale)
+
+            if connection is not None:
+                if self._is_healthy(connection, released_at):
+                    with self._cond:
+                        self._stats["acquired"] += 1
+                        self._stats["reused"] += 1
+                        self._stats["wait_time"] += time.monotonic() - started
+                    return connection
+                # Conexión caída: se descarta y se intenta de nuevo
+                with self._cond:
+                    self._stats["health_check_failures"] += 1
+                self.release(connection, discard=True)
+                continue
+
+            try:
+                connection = self._connect()
+            except Error:
+                with self._cond:
+                    self._size -= 1
+                    self._stats["connect_errors"] += 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._stats["created"] += 1
+                self._stats["acquired"] += 1
+                self._stats["wait_time"] += time.monotonic() - started
+            return connection
+
+    def release(self, connection, discard: bool = False):
+        """Devuelve una conexión al pool, o la cierra si está dañada"""
+        if connection is None:
+            return
+        if not discard and not connection.open:
+            discard = True
+        with self._cond:
+            if discard or self._closed:
+                self._size -= 1
+                self._stats["closed"] += 1
+            else:
+                self._idle.append((connection, time.monotonic()))
+                connection = None
+            self._cond.notify()
+        if connection is not None:
+            self._close_connection(connection)
+
+    def fill(self):
+        """Abre conexiones hasta alcanzar min_size"""
+        connections = []
+        try:
+            with self._cond:
+                missing = self.min_size - self._size
+            for _ in range(max(0, missing)):
+                connections.append(self.acquire())
+        finally:
+            for connection in connections:
+                self.release(connection)
+
+    def close(self):
+        """Cierra todas las conexiones ociosas y rechaza nuevas peticiones"""
+        with self._cond:
+            self._closed = True
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._stats["closed"] += len(idle)
+            self._cond.notify_all()
+        for connection in idle:
+            self._close_connection(connection)
+
+    def stats(self) -> dict:
+        """Estadísticas del pool"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle)
+            })
+        return stats
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    """Obtiene el pool de conexiones, creándolo la primera vez que se usa"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _create_pool()
+    return _pool
+
+def _create_pool() -> ConnectionPool:
+    """Pool del motor configurado en DB_BACKEND"""
+    if DB_BACKEND == "sqlite":
+        import sqlite_backend
+        config = dict(POOL_CONFIG)
+        if sqlite_backend.is_memory(SQLITE_PATH):
+            # Una base en memoria compartida bloquea tablas en lugar de esperar:
+            # una sola conexión serializa los accesos
+            config.update(min_size=1, max_size=1)
+        return ConnectionPool(
+            {"path": SQLITE_PATH, "busy_timeout": POOL_CONFIG["acquire_timeout"]},
+            connect=sqlite_backend.connect, **config
+        )
+    return ConnectionPool(DB_CONFIG, **POOL_CONFIG)
+
+def open_pool():
+    """Precalienta el pool abriendo min_size conexiones"""
+    try:
+        get_pool().fill()
+    except Error as e:
+        logger.error("Error abriendo el pool de conexiones: %s", e)
+
+def close_pool():
+    """Cierra el pool de conexiones (se vuelve a crear si se usa de nuevo)"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
+def get_pool_stats() -> dict:
+    """Estadísticas del pool de conexiones"""
+    return get_pool().stats()
+
 def get_connection():
-    """Obtiene una conexión a la base de datos"""
+    """Obtiene una conexión del pool de conexiones"""
+    started = time.perf_counter()
     try:
-        connection = pymysql.connect(**DB_CONFIG)
-        return connection
+        connection = get_pool().acquire()
     except Error as e:
-        print(f"Error conectando a MySQL: {e}")
+        logger.error("Error conectando a la base de datos: %s", e)
         return None
+    elapsed = time.perf_counter() - started
+    stats = _query_stats.get()
+    if stats is not None:
+        stats.record_connect(elapsed)
+    for listener in _acquire_listeners:
+        listener(elapsed)
+    return connection
+
+def release_connection(connection, discard: bool = False):
+    """Devuelve una conexión al pool; discard=True la cierra definitivamente"""
+    if _pool is not None:
+        _pool.release(connection, discard=discard)
+    elif connection is not None:
+        connection.close()
+
+# ===========================================
+# Ejecución fuera del event loop
+# ===========================================
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def get_executor() -> ThreadPoolExecutor:
+    """Obtiene el executor de base de datos, creándolo la primera vez que se usa"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=DB_EXECUTOR_WORKERS,
+                    thread_name_prefix="db"
+                )
+    return _executor
+
+def shutdown_executor():
+    """Detiene el executor de base de datos esperando las tareas en curso"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+async def run_db(func, *args, **kwargs):
+    """Ejecuta una función bloqueante de acceso a datos en el executor de base de datos.
+
+    El contexto (contextvars) de la petición se copia al hilo del executor.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await loop.run_in_executor(get_executor(), call)
+
+def _is_connection_error(error: Error) -> bool:
+    """Indica si el error deja la conexión inutilizable"""
+    return isinstance(error, (pymysql.OperationalError, pymysql.InterfaceError))
 
 def execute_query(query: str, params: Optional[tuple] = None, fetch: bool = False):
-    """Ejecuta una consulta SQL y retorna los resultados si es necesario"""
+    """Ejecuta una consulta SQL y retorna los resultados si es necesario.
+
+    Lanza DuplicateKeyError si una escritura viola una restricción UNIQUE.
+    """
     connection = get_connection()
     if not connection:
         return None
-    
+
+    discard = False
     try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute(query, params or ())
-        
+        cursor = connection.cursor(pymysql.cursors.DictCursor)
+        _execute(cursor, query, params or ())
+
         if fetch:
             result = cursor.fetchall()
         else:
             connection.commit()
             result = cursor.lastrowid
-        
+
         cursor.close()
         return result
     except Error as e:
-        print(f"Error ejecutando consulta: {e}")
-        connection.rollback()
+        discard = _is_connection_error(e)
+        if not discard:
+            connection.rollback()
+        _raise_if_duplicate(e)
+        logger.error("Error ejecutando consulta: %s", e)
         return None
     finally:
-        connection.close()
+        release_connection(connection, discard=discard)
+
+def execute_update(query: str, params: Optional[tuple] = None) -> Optional[int]:
+    """Ejecuta un UPDATE/DELETE y retorna el número de filas que coincidieron.
+
+    0 indica que ningún registro cumplía la condición; None, que hubo un error.
+    Lanza DuplicateKeyError si la escritura viola una restricción UNIQUE.
+    """
+    connection = get_connection()
+    if not connection:
+        return None
+
+    discard = False
+    try:
+        cursor = connection.cursor()
+        affected = _execute(cursor, query, params or ())
+        connection.commit()
+        cursor.close()
+        return affected
+    except Error as e:
+        discard = _is_connection_error(e)
+        if not discard:
+            connection.rollback()
+        _raise_if_duplicate(e)
+        logger.error("Error ejecutando consulta: %s", e)
+        return None
+    finally:
+        release_connection(connection, discard=discard)
 
 def execute_query_one(query: str, params: Optional[tuple] = None):
     """Ejecuta una consulta SQL y retorna un solo resultado"""
     connection = get_connection()
     if not connection:
         return None
-    
+
+    discard = False
     try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute(query, params or ())
+        cursor = connection.cursor(pymysql.cursors.DictCursor)
+        _execute(cursor, query, params or ())
         result = cursor.fetchone()
         cursor.close()
         return result
     except Error as e:
-        print(f"Error ejecutando consulta: {e}")
+        logger.error("Error ejecutando consulta: %s", e)
+        discard = _is_connection_error(e)
         return None
     finally:
-        connection.close()
+        release_connection(connection, discard=discard)
 
-def initialize_database():
-    """Inicializa la base de datos creando las tablas y datos de ejemplo"""
-    print("🗄️  Inicializando base de datos...")
-    
-    # Crear base de datos si no existe
+def _auto_increment_step(cursor) -> int:
+    """Distancia entre ids AUTO_INCREMENT consecutivos de la sesión.
+
+    Es mayor que 1 con replicación multi-primario o Galera (auto_increment_increment).
+    """
+    if DB_BACKEND != "mysql":
+        return 1
+    _execute(cursor, "SELECT @@SESSION.auto_increment_increment")
+    return int(cursor.fetchone()[0])
+
+def insert_many(table: str, columns: Sequence[str], rows: Sequence[tuple], chunk_size: int = 500,
+                errors: Optional[list] = None) -> Optional[List[Optional[int]]]:
+    """Inserta filas con sentencias INSERT de varias filas, todas en una sola transacción.
+
+    Retorna los ids generados en el orden de 'rows', o None si falla (se revierte todo).
+    Sin 'errors', lanza DuplicateKeyError si alguna fila viola una restricción UNIQUE
+    y no inserta ninguna. Con una lista en 'errors', las filas que la base de datos
+    rechaza (clave duplicada, clave foránea inexistente...) se omiten: su id es None
+    y se agrega (índice en 'rows', error) a la lista; las demás se insertan.
+    """
+    if not rows:
+        return []
+
+    connection = get_connection()
+    if not connection:
+        return None
+
+    row_sql = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    prefix = f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+    discard = False
+    try:
+        ids = []
+        cursor = connection.cursor()
+        connection.begin()
+        step = _auto_increment_step(cursor)
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            try:
+                _execute(cursor, prefix + ", ".join([row_sql] * len(chunk)), [value for row in chunk for value in row])
+            except pymysql.IntegrityError:
+                if errors is None:
+                    raise
+                # Solo se revierte la sentencia fallida: se reintenta fila por fila
+                # para insertar las válidas e identificar las rechazadas
+                for offset, row in enumerate(chunk):
+                    try:
+                        _execute(cursor, prefix + row_sql, row)
+                        ids.append(cursor.lastrowid)
+                    except pymysql.IntegrityError as e:
+                        errors.append((start + offset, e))
+                        ids.append(None)
+                continue
+            # Un INSERT de varias filas con el número de filas conocido recibe sus
+            # ids AUTO_INCREMENT juntos (también con innodb_autoinc_lock_mode = 2);
+            # lastrowid es el primero y los demás siguen cada 'step'.
+            ids.extend(range(cursor.lastrowid, cursor.lastrowid + len(chunk) * step, step))
+        connection.commit()
+        cursor.close()
+        return ids
+    except Error as e:
+        discard = _is_connection_error(e)
+        if not discard:
+            connection.rollback()
+        _raise_if_duplicate(e)
+        logger.error("Error ejecutando inserción por lotes: %s", e)
+        return None
+    finally:
+        release_connection(connection, discard=discard)
+
+def stream_query(query: str, params: Optional[tuple] = None, chunk_size: int = 1000):
+    """Ejecuta una consulta con un cursor no bufferizado y entrega las filas por bloques.
+
+    La conexión queda tomada hasta agotar el generador; si se cierra antes
+    (p. ej. el cliente se desconecta) se descarta en lugar de leer el resto.
+    Los errores (también no obtener una conexión) se propagan: un resultado
+    incompleto no debe parecer completo.
+    """
+    connection = get_connection()
+    if not connection:
+        raise Error("No se pudo obtener una conexión a la base de datos")
+
+    completed = False
+    try:
+        cursor = connection.cursor(pymysql.cursors.SSDictCursor)
+        _execute(cursor, query, params or ())
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+        cursor.close()
+        completed = True
+    except Error as e:
+        logger.error("Error ejecutando consulta: %s", e)
+        raise
+    finally:
+        release_connection(connection, discard=not completed)
+
+def _aplicar_migracion(connection, version: int, descripcion: str, pasos):
+    """Ejecuta los pasos de una migración y la registra en schema_version"""
+    cursor = connection.cursor()
+    for paso in pasos:
+        if isinstance(paso, dict):
+            # Paso con sintaxis propia de cada motor; sin entrada, no aplica
+            paso = paso.get(DB_BACKEND)
+            if paso is None:
+                continue
+        if callable(paso):
+            paso(cursor)
+            continue
+        try:
+            cursor.execute(paso)
+        except pymysql.OperationalError as e:
+            # Bases creadas antes de las migraciones pueden tener ya el índice
+            # (o no tener el que se elimina): el paso ya está aplicado
+            if e.args and e.args[0] in (ER.DUP_KEYNAME, ER.CANT_DROP_FIELD_OR_KEY):
+                continue
+            raise
+    cursor.execute(
+        "INSERT INTO schema_version (version, descripcion) VALUES (%s, %s)",
+        (version, descripcion)
+    )
+    connection.commit()
+    cursor.close()
+
+def _versiones_aplicadas(connection) -> set:
+    """Migraciones aplicadas (ninguna si la tabla schema_version no existe).
+
+    Se leen todas y no solo la máxima: una migración pospuesta queda pendiente
+    aunque se hayan aplicado otras posteriores.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT version FROM schema_version")
+        return {fila[0] for fila in cursor.fetchall()}
+    except pymysql.ProgrammingError as e:
+        if e.args and e.args[0] == ER.NO_SUCH_TABLE:
+            return set()
+        raise
+    finally:
+        cursor.close()
+
+def _pendientes(aplicadas: set) -> list:
+    """Migraciones de MIGRACIONES que no están en 'aplicadas', en orden"""
+    return [migracion for migracion in MIGRACIONES if migracion[0] not in aplicadas]
+
+def _crear_base_de_datos():
+    """Crea la base de datos configurada si todavía no existe"""
     config_without_db = DB_CONFIG.copy()
     del config_without_db['database']
-    
+    connection = pymysql.connect(**config_without_db)
     try:
-        connection = pymysql.connect(**config_without_db)
         cursor = connection.cursor()
         cursor.execute(f"CREATE DATABASE IF NOT EXISTS {DB_CONFIG['database']}")
         cursor.close()
+    finally:
         connection.close()
-        print(f"✅ Base de datos '{DB_CONFIG['database']}' verificada")
+    logger.info("Base de datos '%s' creada", DB_CONFIG['database'])
+
+def initialize_database():
+    """Aplica las migraciones pendientes del esquema (ver migrations.py).
+
+    Con el esquema al día solo se ejecuta una consulta de la versión.
+    """
+    logger.info("Inicializando base de datos")
+
+    try:
+        try:
+            connection = get_pool().acquire()
+        except pymysql.OperationalError as e:
+            if not (e.args and e.args[0] == ER.BAD_DB_ERROR):
+                raise
+            _crear_base_de_datos()
+            connection = get_pool().acquire()
     except Error as e:
-        print(f"❌ Error creando base de datos: {e}")
-        return False
-    
-    # Conectar a la base de datos específica
-    connection = get_connection()
-    if not connection:
+        logger.error("Error conectando a la base de datos: %s", e)
         return False
-    
+
+    lock_name = f"{DB_CONFIG['database']}.initialize_database"
     try:
+        if not _pendientes(_versiones_aplicadas(connection)):
+            logger.info("Esquema al día (versión %s)", ULTIMA_VERSION)
+            release_connection(connection)
+            return True
+
+        # Con varios workers o instancias, solo uno aplica las migraciones a la
+        # vez; los demás esperan y vuelven a leer la versión. SQLite se usa
+        # desde un solo proceso y no tiene GET_LOCK.
+        use_lock = DB_BACKEND == "mysql"
         cursor = connection.cursor()
-        
-        # Crear tablas
-        tables_sql = [
-            # Tabla Paciente
-            """CREATE TABLE IF NOT EXISTS paciente (
-                id_paciente INT AUTO_INCREMENT PRIMARY KEY,
-                nombre VARCHAR(100) NOT NULL,
-                apellido VARCHAR(100) NOT NULL,
-                fecha_nacimiento DATE NOT NULL,
-                telefono VARCHAR(20) UNIQUE,
-                email VARCHAR(120) UNIQUE,
-                direccion VARCHAR(200)
-            )""",
-            
-            # Tabla Especialidad
-            """CREATE TABLE IF NOT EXISTS especialidad (
-                id_especialidad INT AUTO_INCREMENT PRIMARY KEY,
-                nombre VARCHAR(100) NOT NULL,
-                descripcion TEXT
-            )""",
-            
-            # Tabla Doctor
-            """CREATE TABLE IF NOT EXISTS doctor (
-                id_doctor INT AUTO_INCREMENT PRIMARY KEY,
-                nombre VARCHAR(100) NOT NULL,
-                apellido VARCHAR(100) NOT NULL,
-                telefono VARCHAR(20),
-                email VARCHAR(150) UNIQUE,
-                id_especialidad INT NOT NULL,
-                FOREIGN KEY (id_especialidad) REFERENCES especialidad(id_especialidad)
-            )""",
-            
-            # Tabla Historial
-            """CREATE TABLE IF NOT EXISTS historial (
-                id_historial INT AUTO_INCREMENT PRIMARY KEY,
-                fecha DATE NOT NULL,
-                diagnostico TEXT,
-                tratamiento TEXT,
-                observaciones TEXT,
-                id_paciente INT NOT NULL,
-                id_doctor INT NOT NULL,
-                FOREIGN KEY (id_paciente) REFERENCES paciente(id_paciente),
-                FOREIGN KEY (id_doctor) REFERENCES doctor(id_doctor)
-            )""",
-            
-            # Tabla Citas
-            """CREATE TABLE IF NOT EXISTS cita (
-                id_cita INT AUTO_INCREMENT PRIMARY KEY,
-                fecha_hora DATETIME NOT NULL,
-                motivo VARCHAR(255),
-                id_paciente INT,
-                id_doctor INT,
-                FOREIGN KEY (id_paciente) REFERENCES paciente(id_paciente),
-                FOREIGN KEY (id_doctor) REFERENCES doctor(id_doctor)
-            )"""
-        ]
-        
-        # Ejecutar creación de tablas
-        for table_sql in tables_sql:
+        if use_lock:
+            cursor.execute("SELECT GET_LOCK(%s, %s)", (lock_name, BOOTSTRAP_LOCK_TIMEOUT))
+            if cursor.fetchone()[0] != 1:
+                logger.error("No se obtuvo el lock de inicialización de la base de datos")
+                cursor.close()
+                release_connection(connection)
+                return False
+
+        cursor.execute(SCHEMA_VERSION_TABLE)
+        cursor.close()
+        pospuestas = []
+        for version, descripcion, pasos in _pendientes(_versiones_aplicadas(connection)):
+            logger.info("Aplicando migración %s: %s", version, descripcion)
+            # Las conexiones del pool están en autocommit: cada migración en una
+            # transacción (el DDL de MySQL confirma por sí mismo)
+            connection.begin()
             try:
-                cursor.execute(table_sql)
-                connection.commit()
-            except Error as e:
-                if "already exists" not in str(e).lower():
-                    print(f"⚠️  Advertencia creando tabla: {e}")
-        
-        print("✅ Tablas creadas/verificadas")
-        
-        # Verificar si ya existen datos de ejemplo
-        cursor.execute("SELECT COUNT(*) as count FROM especialidad")
-        result = cursor.fetchone()
-        
-        if result and result[0] == 0:
-            print("📝 Insertando datos de ejemplo...")
-            
-            # Insertar especialidades de ejemplo
-            especialidades = [
-                ('Cardiología', 'Especialidad médica que se encarga del diagnóstico y tratamiento de las enfermedades del corazón'),
-                ('Dermatología', 'Especialidad médica que se encarga del diagnóstico y tratamiento de las enfermedades de la piel'),
-                ('Pediatría', 'Especialidad médica que se encarga del cuidado de la salud de los niños'),
-                ('Ginecología', 'Especialidad médica que se encarga de la salud del sistema reproductor femenino'),
-                ('Ortopedia', 'Especialidad médica que se encarga del diagnóstico y tratamiento de lesiones y enfermedades del sistema musculoesquelético')
-            ]
-            
-            for especialidad in especialidades:
-                cursor.execute("INSERT INTO especialidad (nombre, descripcion) VALUES (%s, %s)", especialidad)
-            
-            # Insertar doctores de ejemplo
-            doctores = [
-                ('María', 'García', '3001234567', 'maria.garcia@clinica.com', 1),
-                ('Carlos', 'Rodríguez', '3002345678', 'carlos.rodriguez@clinica.com', 2),
-                ('Ana', 'López', '3003456789', 'ana.lopez@clinica.com', 3),
-                ('Luis', 'Martínez', '3004567890', 'luis.martinez@clinica.com', 4),
-                ('Patricia', 'Hernández', '3005678901', 'patricia.hernandez@clinica.com', 5)
-            ]
-            
-            for doctor in doctores:
-                cursor.execute("INSERT INTO doctor (nombre, apellido, telefono, email, id_especialidad) VALUES (%s, %s, %s, %s, %s)", doctor)
-            
-            # Insertar pacientes de ejemplo
-            pacientes = [
-                ('Juan', 'Pérez', '1990-05-15', '3001111111', 'juan.perez@email.com', 'Calle 123 #45-67'),
-                ('María', 'González', '1985-08-22', '3002222222', 'maria.gonzalez@email.com', 'Carrera 78 #90-12'),
-                ('Pedro', 'Sánchez', '1995-03-10', '3003333333', 'pedro.sanchez@email.com', 'Avenida 5 #23-45'),
-                ('Ana', 'Ramírez', '1988-12-05', '3004444444', 'ana.ramirez@email.com', 'Calle 67 #89-01'),
-                ('Luis', 'Torres', '1992-07-18', '3005555555', 'luis.torres@email.com', 'Carrera 34 #56-78')
-            ]
-            
-            for paciente in pacientes:
-                cursor.execute("INSERT INTO paciente (nombre, apellido, fecha_nacimiento, telefono, email, direccion) VALUES (%s, %s, %s, %s, %s, %s)", paciente)
-            
-            # Insertar citas de ejemplo
-            citas = [
-                ('2024-01-15 10:00:00', 'Consulta de rutina', 1, 1),
-                ('2024-01-15 14:30:00', 'Revisión de piel', 2, 2),
-                ('2024-01-16 09:00:00', 'Control pediátrico', 3, 3),
-                ('2024-01-16 11:30:00', 'Consulta ginecológica', 4, 4),
-                ('2024-01-17 15:00:00', 'Revisión ortopédica', 5, 5)
-            ]
-            
-            for cita in citas:
-                cursor.execute("INSERT INTO cita (fecha_hora, motivo, id_paciente, id_doctor) VALUES (%s, %s, %s, %s)", cita)
-            
-            # Insertar historiales de ejemplo
-            historiales = [
-                ('2024-01-10', 'Hipertensión arterial', 'Enalapril 10mg diario', 'Paciente con presión arterial elevada', 1, 1),
-                ('2024-01-12', 'Dermatitis atópica', 'Cremas hidratantes y antihistamínicos', 'Paciente con piel seca y picazón', 2, 2),
-                ('2024-01-08', 'Resfriado común', 'Reposo y líquidos abundantes', 'Paciente con síntomas leves', 3, 3),
-                ('2024-01-05', 'Control ginecológico normal', 'Sin tratamiento requerido', 'Paciente en buen estado de salud', 4, 4),
-                ('2024-01-03', 'Esguince de tobillo', 'Reposo, hielo y elevación', 'Paciente con lesión deportiva', 5, 5)
-            ]
-            
-            for historial in historiales:
-                cursor.execute("INSERT INTO historial (fecha, diagnostico, tratamiento, observaciones, id_paciente, id_doctor) VALUES (%s, %s, %s, %s, %s, %s)", historial)
-            
-            connection.commit()
-            print("✅ Datos de ejemplo insertados")
+                _aplicar_migracion(connection, version, descripcion, pasos)
+            except MigracionPospuesta as e:
+                connection.rollback()
+                pospuestas.append(version)
+                logger.warning("Migración %s (%s) pospuesta: %s", version, descripcion, e)
+
+        if pospuestas:
+            logger.warning("Base de datos inicializada con migraciones pendientes: %s", pospuestas)
         else:
-            print("ℹ️  Los datos de ejemplo ya existen")
-        
-        # Crear índices para optimizar consultas
-        indices = [
-            "CREATE INDEX IF NOT EXISTS idx_cita_fecha_hora ON cita(fecha_hora)",
-            "CREATE INDEX IF NOT EXISTS idx_cita_paciente ON cita(id_paciente)",
-            "CREATE INDEX IF NOT EXISTS idx_cita_doctor ON cita(id_doctor)",
-            "CREATE INDEX IF NOT EXISTS idx_historial_paciente ON historial(id_paciente)",
-            "CREATE INDEX IF NOT EXISTS idx_historial_fecha ON historial(fecha)",
-            "CREATE INDEX IF NOT EXISTS idx_doctor_especialidad ON doctor(id_especialidad)"
-        ]
-        
-        for index_sql in indices:
-            try:
-                cursor.execute(index_sql)
-                connection.commit()
-            except Error as e:
-                if "already exists" not in str(e).lower():
-                    print(f"⚠️  Advertencia creando índice: {e}")
-        
-        print("✅ Índices creados/verificados")
-        print("🎉 Base de datos inicializada correctamente")
-        
-        cursor.close()
-        connection.close()
+            logger.info("Base de datos inicializada (versión %s)", ULTIMA_VERSION)
+
+        if use_lock:
+            cursor = connection.cursor()
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (lock_name,))
+            cursor.close()
+        release_connection(connection)
         return True
-        
+
     except Error as e:
-        print(f"❌ Error inicializando base de datos: {e}")
+        logger.error("Error inicializando base de datos: %s", e)
+        # Cerrar la sesión libera también el lock
+        release_connection(connection, discard=True)
         return False
@@ -117,11 +117,15 @@ INSERT INTO historial (fecha, diagnostico, tratamiento, observaciones, id_pacien
 -- Índices para optimizar consultas
 -- ===========================================
 CREATE INDEX idx_cita_fecha_hora ON cita(fecha_hora);
-CREATE INDEX idx_cita_paciente ON cita(id_paciente);
+CREATE INDEX idx_cita_paciente_fecha_hora ON cita(id_paciente, fecha_hora);
 CREATE INDEX idx_cita_doctor ON cita(id_doctor);
+CREATE UNIQUE INDEX uq_cita_doctor_fecha_hora ON cita(id_doctor, fecha_hora);
 CREATE INDEX idx_historial_paciente ON historial(id_paciente);
 CREATE INDEX idx_historial_fecha ON historial(fecha);
 CREATE INDEX idx_doctor_especialidad ON doctor(id_especialidad);
+CREATE INDEX idx_paciente_apellido_nombre ON paciente(apellido, nombre);
+CREATE INDEX idx_paciente_nombre ON paciente(nombre);
+CREATE FULLTEXT INDEX ft_historial_texto ON historial(diagnostico, tratamiento, observaciones);
 
 -- ===========================================
 -- Verificar la creación de las tablas
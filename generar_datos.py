@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Generador de datos sintéticos para el Sistema de Citas Médicas
+
+Llena las tablas con volúmenes configurables (p. ej. 1M pacientes y 10M citas)
+para reproducir localmente el rendimiento con datos de producción.
+
+Uso:
+    python generar_datos.py --pacientes 1000000 --doctores 2000 --citas 10000000
+"""
+
+import argparse
+import itertools
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from pymysql import Error
+from database import (
+    DuplicateKeyError, close_pool, execute_query, get_connection,
+    initialize_database, insert_many, release_connection
+)
+from crud import HORARIOS_BASE
+from logging_config import setup_logging, shutdown_logging
+
+NOMBRES = [
+    "Juan", "María", "Pedro", "Ana", "Luis", "Carmen", "José", "Laura", "Carlos", "Sofía",
+    "Andrés", "Valentina", "Jorge", "Camila", "Miguel", "Isabella", "Diego", "Daniela",
+    "Santiago", "Gabriela", "Felipe", "Natalia", "Ricardo", "Paula", "Fernando", "Juliana",
+    "Alejandro", "Mariana", "Sebastián", "Catalina", "Manuel", "Lucía", "Javier", "Elena"
+]
+
+APELLIDOS = [
+    "García", "Rodríguez", "Martínez", "López", "González", "Pérez", "Sánchez", "Ramírez",
+    "Torres", "Flores", "Rivera", "Gómez", "Díaz", "Cruz", "Morales", "Reyes", "Gutiérrez",
+    "Ortiz", "Jiménez", "Hernández", "Ruiz", "Vargas", "Castillo", "Romero", "Suárez",
+    "Mendoza", "Herrera", "Medina", "Aguilar", "Castro", "Rojas", "Moreno", "Muñoz", "Álvarez"
+]
+
+CALLES = ["Calle", "Carrera", "Avenida", "Diagonal", "Transversal"]
+
+ESPECIALIDADES = [
+    "Medicina General", "Cardiología", "Dermatología", "Pediatría", "Ginecología",
+    "Ortopedia", "Neurología", "Oftalmología", "Otorrinolaringología", "Psiquiatría",
+    "Endocrinología", "Gastroenterología", "Neumología", "Urología", "Nefrología",
+    "Reumatología", "Oncología", "Hematología", "Infectología", "Geriatría"
+]
+
+MOTIVOS = [
+    "Consulta de rutina", "Control", "Dolor persistente", "Revisión de exámenes",
+    "Primera consulta", "Seguimiento de tratamiento", "Renovación de fórmula", "Urgencia menor"
+]
+
+DIAGNOSTICOS = [
+    ("Hipertensión arterial", "Enalapril 10mg diario"),
+    ("Diabetes tipo 2", "Metformina 850mg cada 12 horas"),
+    ("Dermatitis atópica", "Cremas hidratantes y antihistamínicos"),
+    ("Resfriado común", "Reposo y líquidos abundantes"),
+    ("Lumbalgia mecánica", "Analgésicos y terapia física"),
+    ("Migraña", "Sumatriptán en crisis"),
+    ("Gastritis", "Omeprazol 20mg en ayunas"),
+    ("Control sin hallazgos", "Sin tratamiento requerido")
+]
+
+# Las mañanas concentran más citas que las tardes
+PESOS_HORARIO = [3 if hora < "12:00" else 2 for hora in HORARIOS_BASE]
+_HORAS = [datetime.strptime(hora, "%H:%M").time() for hora in HORARIOS_BASE]
+_PESOS_ACUMULADOS = list(itertools.accumulate(PESOS_HORARIO))
+
+# ===========================================
+# Utilidades
+# ===========================================
+def _sesgado(rng: random.Random, n: int, sesgo: float) -> int:
+    """Índice en [0, n) donde los primeros son más frecuentes (sesgo 1 = uniforme)"""
+    return min(n - 1, int(n * rng.random() ** sesgo))
+
+def _dias_habiles(desde: date, hasta: date) -> list:
+    """Días de lunes a viernes en el rango [desde, hasta]"""
+    dias = []
+    dia = desde
+    while dia <= hasta:
+        if dia.weekday() < 5:
+            dias.append(dia)
+        dia += timedelta(days=1)
+    return dias
+
+def _max_id(tabla: str, pk: str) -> int:
+    """Mayor id de la tabla (0 si está vacía)"""
+    resultado = execute_query(f"SELECT COALESCE(MAX({pk}), 0) as max_id FROM {tabla}", fetch=True)
+    return resultado[0]["max_id"] if resultado else 0
+
+def _ids_existentes(tabla: str, pk: str) -> list:
+    """Ids ya guardados en la tabla"""
+    resultado = execute_query(f"SELECT {pk} FROM {tabla} ORDER BY {pk}", fetch=True)
+    return [fila[pk] for fila in resultado or []]
+
+def _progreso(tabla: str, hechos: int, total: int, inicio: float):
+    """Imprime el avance de la carga de una tabla"""
+    transcurrido = max(time.perf_counter() - inicio, 1e-9)
+    print(f"\r   {tabla}: {hechos:,}/{total:,} ({hechos / transcurrido:,.0f} filas/s)", end="", flush=True)
+
+def _insertar_ignorando(tabla: str, columnas: list, filas: list) -> int:
+    """INSERT IGNORE en una transacción; retorna las filas insertadas.
+
+    PyMySQL convierte executemany de un INSERT en sentencias de varias filas.
+    """
+    connection = get_connection()
+    if not connection:
+        raise RuntimeError("No se pudo conectar a la base de datos")
+
+    discard = True
+    try:
+        cursor = connection.cursor()
+        connection.begin()
+        cursor.executemany(
+            f"INSERT IGNORE INTO {tabla} ({', '.join(columnas)}) VALUES ({', '.join(['%s'] * len(columnas))})",
+            filas
+        )
+        insertadas = cursor.rowcount
+        connection.commit()
+        cursor.close()
+        discard = False
+        return insertadas
+    finally:
+        release_connection(connection, discard=discard)
+
+def _insertar_con_ids(tabla: str, columnas: list, filas: list, lote: int) -> list:
+    """Inserta un lote con sentencias de varias filas y retorna los ids generados"""
+    ids = insert_many(tabla, columnas, filas, chunk_size=lote)
+    if ids is None:
+        raise RuntimeError(f"Falló la inserción en {tabla}")
+    return ids
+
+# ===========================================
+# Generadores por tabla
+# ===========================================
+def generar_especialidades(cantidad: int, lote: int) -> list:
+    """Inserta especialidades; retorna sus ids"""
+    filas = []
+    for i in range(cantidad):
+        nombre = ESPECIALIDADES[i % len(ESPECIALIDADES)]
+        if i >= len(ESPECIALIDADES):
+            nombre = f"{nombre} {i // len(ESPECIALIDADES) + 1}"
+        filas.append((nombre, f"Especialidad de {nombre.lower()}"))
+    return _insertar_con_ids("especialidad", ["nombre", "descripcion"], filas, lote)
+
+def generar_doctores(rng: random.Random, cantidad: int, especialidades: list, lote: int) -> list:
+    """Inserta doctores repartidos entre las especialidades (las primeras tienen más); retorna sus ids"""
+    base = _max_id("doctor", "id_doctor")
+    ids = []
+    inicio = time.perf_counter()
+    for desde in range(0, cantidad, lote):
+        filas = []
+        for i in range(desde, min(desde + lote, cantidad)):
+            n = base + i + 1
+            filas.append((
+                rng.choice(NOMBRES),
+                rng.choice(APELLIDOS),
+                f"7{n:09d}",
+                f"doctor{n}@clinica.ejemplo.com",
+                especialidades[_sesgado(rng, len(especialidades), 1.5)]
+            ))
+        ids.extend(_insertar_con_ids("doctor", ["nombre", "apellido", "telefono", "email", "id_especialidad"], filas, lote))
+        _progreso("doctor", len(ids), cantidad, inicio)
+    print()
+    return ids
+
+def generar_pacientes(rng: random.Random, cantidad: int, lote: int) -> list:
+    """Inserta pacientes con edades entre 0 y 95 años; retorna sus ids"""
+    base = _max_id("paciente", "id_paciente")
+    hoy = date.today()
+    ids = []
+    inicio = time.perf_counter()
+    for desde in range(0, cantidad, lote):
+        filas = []
+        for i in range(desde, min(desde + lote, cantidad)):
+            n = base + i + 1
+            edad_dias = int(rng.triangular(0, 95, 35) * 365.25)
+            filas.append((
+                rng.choice(NOMBRES),
+                f"{rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}",
+                hoy - timedelta(days=edad_dias),
+                f"6{n:09d}",
+                f"paciente{n}@ejemplo.com",
+                f"{rng.choice(CALLES)} {rng.randint(1, 200)} #{rng.randint(1, 99)}-{rng.randint(1, 99)}"
+            ))
+        ids.extend(_insertar_con_ids(
+            "paciente", ["nombre", "apellido", "fecha_nacimiento", "telefono", "email", "direccion"], filas, lote
+        ))
+        _progreso("paciente", len(ids), cantidad, inicio)
+    print()
+    return ids
+
+def generar_citas(rng: random.Random, cantidad: int, pacientes: list, doctores: list,
+                  dias: list, lote: int) -> int:
+    """Inserta citas en días hábiles y horarios base; retorna cuántas se insertaron.
+
+    Algunos doctores y pacientes concentran muchas más citas que otros. Los
+    horarios ya ocupados (índice único doctor + fecha_hora) se descartan con
+    INSERT IGNORE y se generan otros hasta completar la cantidad.
+    """
+    columnas = ["fecha_hora", "motivo", "id_paciente", "id_doctor"]
+    insertadas = 0
+    intentos_sin_avance = 0
+    inicio = time.perf_counter()
+    while insertadas < cantidad and intentos_sin_avance < 10:
+        filas = []
+        for _ in range(min(lote, cantidad - insertadas)):
+            hora = rng.choices(_HORAS, cum_weights=_PESOS_ACUMULADOS)[0]
+            filas.append((
+                datetime.combine(rng.choice(dias), hora),
+                rng.choice(MOTIVOS),
+                pacientes[_sesgado(rng, len(pacientes), 2)],
+                doctores[_sesgado(rng, len(doctores), 2)]
+            ))
+        nuevas = _insertar_ignorando("cita", columnas, filas)
+        intentos_sin_avance = intentos_sin_avance + 1 if nuevas == 0 else 0
+        insertadas += nuevas
+        _progreso("cita", insertadas, cantidad, inicio)
+    print()
+    if insertadas < cantidad:
+        print("⚠️  No quedan horarios libres: aumenta --doctores o el rango de fechas")
+    return insertadas
+
+def generar_historiales(rng: random.Random, cantidad: int, pacientes: list, doctores: list,
+                        dias: list, lote: int) -> int:
+    """Inserta registros de historial en fechas pasadas; retorna cuántos se insertaron"""
+    columnas = ["fecha", "diagnostico", "tratamiento", "observaciones", "id_paciente", "id_doctor"]
+    insertados = 0
+    inicio = time.perf_counter()
+    while insertados < cantidad:
+        filas = []
+        for _ in range(min(lote, cantidad - insertados)):
+            diagnostico, tratamiento = rng.choice(DIAGNOSTICOS)
+            filas.append((
+                rng.choice(dias),
+                diagnostico,
+                tratamiento,
+                f"Paciente atendido por {diagnostico.lower()}",
+                pacientes[_sesgado(rng, len(pacientes), 2)],
+                doctores[_sesgado(rng, len(doctores), 2)]
+            ))
+        insertados += len(_insertar_con_ids("historial", columnas, filas, lote))
+        _progreso("historial", insertados, cantidad, inicio)
+    print()
+    return insertados
+
+# ===========================================
+# Línea de comandos
+# ===========================================
+def _fecha(valor: str) -> date:
+    """Convierte un argumento AAAA-MM-DD en fecha"""
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Fecha inválida: {valor} (formato AAAA-MM-DD)")
+
+def parse_args(argv=None):
+    hoy = date.today()
+    parser = argparse.ArgumentParser(description="Genera datos sintéticos para el Sistema de Citas Médicas")
+    parser.add_argument("--especialidades", type=int, default=20, help="Especialidades a crear (0 = usar las existentes)")
+    parser.add_argument("--doctores", type=int, default=200, help="Doctores a crear (0 = usar los existentes)")
+    parser.add_argument("--pacientes", type=int, default=10000, help="Pacientes a crear (0 = usar los existentes)")
+    parser.add_argument("--citas", type=int, default=100000, help="Citas a crear")
+    parser.add_argument("--historiales", type=int, default=50000, help="Registros de historial a crear")
+    parser.add_argument("--desde", type=_fecha, default=hoy - timedelta(days=365), help="Primera fecha de citas (AAAA-MM-DD)")
+    parser.add_argument("--hasta", type=_fecha, default=hoy + timedelta(days=90), help="Última fecha de citas (AAAA-MM-DD)")
+    parser.add_argument("--lote", type=int, default=1000, help="Filas por sentencia INSERT")
+    parser.add_argument("--semilla", type=int, default=None, help="Semilla aleatoria para repetir el mismo conjunto")
+    args = parser.parse_args(argv)
+
+    if args.hasta < args.desde:
+        parser.error("--hasta debe ser posterior a --desde")
+    if args.lote < 1:
+        parser.error("--lote debe ser mayor que 0")
+    return args
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    rng = random.Random(args.semilla)
+    setup_logging()
+
+    if not initialize_database():
+        shutdown_logging()
+        return 1
+
+    inicio = time.perf_counter()
+    try:
+        print("📝 Generando datos sintéticos...")
+        especialidades = (generar_especialidades(args.especialidades, args.lote) if args.especialidades
+                          else _ids_existentes("especialidad", "id_especialidad"))
+        if not especialidades:
+            print("❌ No hay especialidades")
+            return 1
+
+        doctores = (generar_doctores(rng, args.doctores, especialidades, args.lote) if args.doctores
+                    else _ids_existentes("doctor", "id_doctor"))
+        pacientes = (generar_pacientes(rng, args.pacientes, args.lote) if args.pacientes
+                     else _ids_existentes("paciente", "id_paciente"))
+        if not doctores or not pacientes:
+            print("❌ Se necesitan doctores y pacientes para generar citas e historiales")
+            return 1
+
+        dias = _dias_habiles(args.desde, args.hasta)
+        capacidad = len(dias) * len(HORARIOS_BASE) * len(doctores)
+        if args.citas > capacidad:
+            print(f"❌ {args.citas:,} citas no caben en {capacidad:,} horarios (doctores × días hábiles × horarios)")
+            return 1
+        generar_citas(rng, args.citas, pacientes, doctores, dias, args.lote)
+
+        dias_pasados = [dia for dia in dias if dia <= date.today()] or dias
+        generar_historiales(rng, args.historiales, pacientes, doctores, dias_pasados, args.lote)
+    except (DuplicateKeyError, Error, RuntimeError) as e:
+        print(f"\n❌ Error generando datos: {e}")
+        return 1
+    finally:
+        close_pool()
+        shutdown_logging()
+
+    print(f"🎉 Datos generados en {time.perf_counter() - inicio:,.1f} s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+"""
+Configuración de Gunicorn para producción:
+
+    gunicorn main:app -c gunicorn.conf.py
+
+Cada worker es un proceso uvicorn con su propio pool de conexiones y su
+propio executor de base de datos. La inicialización del esquema se hace una
+sola vez en el proceso maestro, antes de crear los workers.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+# En contenedores cpu_count() reporta los núcleos del host (16-64), y cada worker
+# abre hasta DB_POOL_MAX_SIZE conexiones: el valor por defecto se mantiene bajo
+workers = int(os.getenv("WEB_CONCURRENCY", min(multiprocessing.cpu_count(), 2)))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Conexiones pendientes de aceptar y segundos que se mantiene abierta una conexión ociosa
+backlog = int(os.getenv("GUNICORN_BACKLOG", 2048))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+
+# Reciclar workers cada N peticiones (0 = nunca)
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 0))
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+
+def on_starting(server):
+    """Inicializa la base de datos una vez, en el maestro, antes de crear los workers"""
+    from database import close_pool, initialize_database
+    from logging_config import setup_logging
+
+    setup_logging()
+    if initialize_database():
+        # Los workers heredan el entorno y omiten la inicialización en su lifespan
+        os.environ["DB_INIT_ON_STARTUP"] = "false"
+    # Las conexiones no deben compartirse con los procesos hijos
+    close_pool()
+
+    # Métricas de una ejecución anterior no deben sumarse a las nuevas
+    directorio = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if directorio and os.path.isdir(directorio):
+        for nombre in os.listdir(directorio):
+            if nombre.endswith(".db"):
+                os.remove(os.path.join(directorio, nombre))
+
+def child_exit(server, worker):
+    """Descarta los gauges en vivo del worker que terminó"""
+    from metrics import mark_process_dead
+
+    mark_process_dead(worker.pid)
@@ -0,0 +1,114 @@
+"""
+Logging estructurado (JSON) que no escribe en el hilo de la petición.
+
+Los módulos registran con logging.getLogger(__name__). setup_logging() pone los
+registros en una cola acotada y un hilo (QueueListener) los escribe en stdout;
+si la cola se llena (p. ej. una tormenta de errores con la base de datos caída)
+los registros se descartan en lugar de frenar las peticiones. Cada registro
+lleva el id de la petición en curso (X-Request-ID).
+"""
+
+from datetime import datetime, timezone
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()  # json | texto
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+# Id de la petición en curso; run_db lo copia al hilo del executor con el resto del contexto
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+
+# Atributos propios de LogRecord: el resto son campos extra (logger.info(..., extra={...}))
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "request_id"}
+
+class RequestIdFilter(logging.Filter):
+    """Agrega request_id al registro (se ejecuta en el hilo que registra)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """Un objeto JSON por línea con fecha, nivel, logger, mensaje, request_id y campos extra"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        request_id = getattr(record, "request_id", "-")
+        if request_id != "-":
+            entry["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que descarta registros cuando la cola está llena"""
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # El mensaje y la traza se resuelven aquí: los argumentos pueden cambiar
+        # antes de que el hilo del listener los escriba
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_listener = None
+_listener_pid = None
+
+def setup_logging():
+    """Configura el logger raíz del proceso (se puede llamar varias veces; tras un fork se rehace)"""
+    global _listener, _listener_pid
+    if _listener is not None and _listener_pid == os.getpid():
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "json":
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+
+    handler = _DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+
+    # El listener heredado de otro proceso no tiene hilo en este: no se detiene
+    _listener = logging.handlers.QueueListener(handler.queue, stream, respect_handler_level=True)
+    _listener_pid = os.getpid()
+    _listener.start()
+
+def shutdown_logging():
+    """Escribe los registros pendientes y detiene el hilo del listener"""
+    global _listener
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+    _listener = None
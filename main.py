@@ -1,8 +1,24 @@
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, HTTPException, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import ValidationError
+from pymysql import Error as DatabaseError
 from typing import List, Optional
 from datetime import date, datetime
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
 import crud
+import metrics
+from database import DuplicateKeyError, describe_integrity_error, get_executor, run_db, track_queries
+from logging_config import request_id_var, setup_logging, shutdown_logging
 from models import *
 
 # Evento de inicio para inicializar la base de datos
@@ -11,10 +27,19 @@ from contextlib import asynccontextmanager
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    from database import initialize_database
-    initialize_database()
+    from database import initialize_database, open_pool, close_pool, shutdown_executor
+    setup_logging()
+    # Con gunicorn la inicialización ya se hizo una vez en el proceso maestro
+    if os.getenv("DB_INIT_ON_STARTUP", "true").lower() == "true":
+        await run_db(initialize_database)
+    await run_db(open_pool)
     yield
-    # Shutdown (si es necesario)
+    # Shutdown
+    shutdown_executor()
+    close_pool()
+    shutdown_logging()
+
+logger = logging.getLogger(__name__)
 
 # Crear aplicación FastAPI con lifespan
 app = FastAPI(
@@ -31,51 +56,276 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Query-Count", "Server-Timing", "X-DB-Summary", "X-Request-ID"],
 )
 
+# Un X-Request-ID recibido se reutiliza solo si es un identificador razonable
+_REQUEST_ID_VALIDO = re.compile(r"^[A-Za-z0-9._-]{1,128}$")
+
+# Agrega X-DB-Summary con las consultas y el tiempo por función de crud (solo para diagnóstico)
+DB_DEBUG_SUMMARY = os.getenv("DB_DEBUG_SUMMARY", "false").lower() == "true"
+
+def _server_timing(stats, total: float) -> str:
+    """Encabezado Server-Timing: base de datos, obtención de conexiones y total (ms)"""
+    return (
+        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} consultas", '
+        f'conn;dur={stats.connect_time * 1000:.1f};desc="{stats.connections} conexiones", '
+        f'app;dur={total * 1000:.1f}'
+    )
+
+def _resumen_consultas(stats) -> str:
+    """Consultas y milisegundos por función de crud, p. ej. 'obtener_cita=1/0.8ms'"""
+    return ", ".join(
+        f"{funcion}={consultas}/{segundos * 1000:.1f}ms"
+        for funcion, (consultas, segundos) in sorted(stats.by_function.items())
+    )
+
+@app.middleware("http")
+async def medir_peticion(request: Request, call_next):
+    """Asigna el id de la petición (X-Request-ID) a sus registros de log, registra
+    la duración y el estado en las métricas e informa en X-Query-Count y
+    Server-Timing las consultas y el tiempo en la base de datos. Un error no
+    controlado se registra y se responde como 500, con X-Request-ID.
+
+    En las exportaciones los encabezados salen antes que el cuerpo, así que solo
+    cuentan las consultas previas al primer bloque.
+    """
+    inicio = time.perf_counter()
+    request_id = request.headers.get("X-Request-ID", "")
+    if not _REQUEST_ID_VALIDO.match(request_id):
+        request_id = uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    status_code = 500
+    try:
+        with track_queries(DB_DEBUG_SUMMARY) as stats:
+            response = await call_next(request)
+        status_code = response.status_code
+    except Exception:
+        # Se registra una sola vez, aquí y con el id de la petición: la respuesta
+        # 500 se arma en lugar de relanzar para que el servidor no la registre otra vez
+        logger.exception("Error no controlado en %s %s", request.method, request.url.path)
+        response = JSONResponse(status_code=500, content={"detail": "Error interno del servidor"})
+    finally:
+        total = time.perf_counter() - inicio
+        # La plantilla de la ruta (no la URL) mantiene acotadas las series de métricas
+        route = request.scope.get("route")
+        metrics.observe_request(request.method, route.path if route else "sin_ruta", status_code, total)
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    response.headers["X-Query-Count"] = str(stats.queries)
+    response.headers["Server-Timing"] = _server_timing(stats, total)
+    if DB_DEBUG_SUMMARY:
+        response.headers["X-DB-Summary"] = _resumen_consultas(stats)
+    return response
+
+@app.exception_handler(DuplicateKeyError)
+async def registro_duplicado_handler(request: Request, exc: DuplicateKeyError):
+    """Las violaciones de restricciones UNIQUE se informan como conflicto"""
+    return JSONResponse(
+        status_code=status.HTTP_409_CONFLICT,
+        content={"detail": "El registro entra en conflicto con uno existente"}
+    )
+
+# ===========================================
+# Respuestas JSON condicionales (ETag)
+# ===========================================
+def _valor_json(valor):
+    """Convierte fechas a ISO 8601 al serializar"""
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+def _etag_coincide(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparación débil de If-None-Match contra el ETag (RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidato.strip().removeprefix("W/") == etag
+        for candidato in if_none_match.split(",")
+    )
+
+def _respuesta_json(request: Request, contenido, headers: Optional[dict] = None) -> Response:
+    """Serializa el contenido una sola vez, con un ETag fuerte calculado sobre el cuerpo.
+
+    Si el cliente ya tiene esa versión (If-None-Match) responde 304 sin cuerpo.
+    """
+    cuerpo = json.dumps(
+        contenido, default=_valor_json, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+    etag = '"' + hashlib.sha256(cuerpo).hexdigest()[:32] + '"'
+    headers = dict(headers or {}, ETag=etag)
+
+    if _etag_coincide(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=cuerpo, media_type="application/json", headers=headers)
+
+def _lista_campos(campos: Optional[str]) -> Optional[List[str]]:
+    """Campos pedidos en el parámetro 'campos' (separados por comas), o None para todos"""
+    if campos is None:
+        return None
+    return [campo.strip() for campo in campos.split(",") if campo.strip()] or None
+
+async def _leer(func, *args, **kwargs):
+    """run_db para lecturas: un catálogo que no pudo leerse de la base es un 503"""
+    try:
+        return await run_db(func, *args, **kwargs)
+    except DatabaseError:
+        raise HTTPException(status_code=503, detail="No se pudo leer la base de datos")
+
+async def _listar_paginado(request: Request, orden: tuple, func, *args,
+                           limite: int, cursor: Optional[str], campos: Optional[str] = None) -> Response:
+    """Ejecuta un listado paginado y publica el cursor siguiente en X-Next-Cursor"""
+    try:
+        filas = await _leer(func, *args, limite=limite, cursor=cursor, campos=_lista_campos(campos))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    siguiente = crud.siguiente_cursor(filas, limite, orden)
+    return _respuesta_json(request, filas, {"X-Next-Cursor": siguiente} if siguiente else None)
+
+async def _detalle(request: Request, func, id_registro: int, campos: Optional[str],
+                   no_encontrado: str) -> Response:
+    """Lee un registro por id (solo los 'campos' pedidos) o responde 404"""
+    try:
+        registro = await run_db(func, id_registro, _lista_campos(campos))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not registro:
+        raise HTTPException(status_code=404, detail=no_encontrado)
+    return _respuesta_json(request, registro)
+
+def _validar_rango(desde: Optional[date], hasta: Optional[date]):
+    """Rechaza un filtro de fechas invertido"""
+    if desde and hasta and hasta < desde:
+        raise HTTPException(status_code=400, detail="hasta debe ser posterior o igual a desde")
+
+# ===========================================
+# Escrituras por id
+# ===========================================
+async def _modificar(func, *args, no_encontrado: str, error: str):
+    """Ejecuta un UPDATE/DELETE por id y decide 404/400 por las filas afectadas"""
+    try:
+        filas = await run_db(func, *args)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if filas is None:
+        raise HTTPException(status_code=400, detail=error)
+    if filas == 0:
+        raise HTTPException(status_code=404, detail=no_encontrado)
+
+# ===========================================
+# Carga masiva
+# ===========================================
+async def _crear_en_lote(registros: List[dict], modelo, func, campo_id: str, tamano_lote: int):
+    """Valida cada registro por separado e inserta los válidos en una sola transacción.
+
+    Retorna el resultado por índice: el id generado, los errores de validación o
+    el motivo por el que la base de datos rechazó el registro (p. ej. un horario
+    ya reservado); los demás registros se insertan igual.
+    """
+    if len(registros) > crud.MAX_REGISTROS_CARGA:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Se admiten como máximo {crud.MAX_REGISTROS_CARGA} registros por petición"
+        )
+
+    resultados = []
+    validos = []
+    for indice, registro in enumerate(registros):
+        try:
+            validos.append((indice, modelo.model_validate(registro)))
+        except ValidationError as e:
+            resultados.append({"indice": indice, "error": e.errors(include_url=False, include_context=False)})
+
+    if not validos:
+        return JSONResponse(status_code=422, content={"insertados": 0, "resultados": resultados})
+
+    rechazados = []
+    ids = await run_db(func, [item for _, item in validos], tamano_lote, rechazados)
+    if ids is None:
+        raise HTTPException(status_code=400, detail="Error en la carga masiva; no se insertó ningún registro")
+
+    resultados.extend(
+        {"indice": validos[posicion][0], "error": describe_integrity_error(error)} for posicion, error in rechazados
+    )
+    resultados.extend(
+        {"indice": indice, campo_id: id_generado}
+        for (indice, _), id_generado in zip(validos, ids) if id_generado is not None
+    )
+    resultados.sort(key=lambda resultado: resultado["indice"])
+    insertados = len(ids) - len(rechazados)
+    contenido = {"insertados": insertados, "resultados": resultados}
+    if not insertados:
+        return JSONResponse(status_code=status.HTTP_409_CONFLICT, content=contenido)
+    return contenido
+
 # ===========================================
 # Endpoints para Paciente
 # ===========================================
 @app.post("/pacientes/", response_model=dict, status_code=status.HTTP_201_CREATED)
 async def crear_paciente_endpoint(paciente: PacienteCreate):
     """Crear un nuevo paciente"""
-    paciente_id = crud.crear_paciente(paciente)
+    paciente_id = await run_db(crud.crear_paciente, paciente)
     if paciente_id:
         return {"message": "Paciente creado exitosamente", "id_paciente": paciente_id}
     raise HTTPException(status_code=400, detail="Error al crear el paciente")
 
+@app.post("/pacientes/bulk", response_model=dict, status_code=status.HTTP_201_CREATED)
+async def crear_pacientes_endpoint(
+    pacientes: List[dict],
+    tamano_lote: int = Query(crud.TAMANO_LOTE_INSERCION, ge=1, le=5000)
+):
+    """Crear varios pacientes en una sola transacción"""
+    return await _crear_en_lote(pacientes, PacienteCreate, crud.crear_pacientes, "id_paciente", tamano_lote)
+
 @app.get("/pacientes/", response_model=List[dict])
-async def obtener_pacientes_endpoint():
-    """Obtener todos los pacientes"""
-    return crud.obtener_pacientes()
+async def obtener_pacientes_endpoint(
+    request: Request,
+    limite: int = Query(crud.LIMITE_POR_DEFECTO, ge=1, le=crud.LIMITE_MAXIMO),
+    cursor: Optional[str] = None,
+    campos: Optional[str] = None
+):
+    """Obtener los pacientes, paginados por cursor"""
+    return await _listar_paginado(
+        request, crud.ORDEN_PACIENTES, crud.obtener_pacientes,
+        limite=limite, cursor=cursor, campos=campos
+    )
+
+@app.get("/pacientes/buscar", response_model=List[dict])
+async def buscar_pacientes_endpoint(
+    request: Request,
+    q: str = Query(..., min_length=2, max_length=120),
+    limite: int = Query(crud.LIMITE_BUSQUEDA_PACIENTES, ge=1, le=50)
+):
+    """Buscar pacientes cuyo apellido, nombre, teléfono o email empieza por el texto"""
+    pacientes = await run_db(crud.buscar_pacientes, q, limite)
+    return _respuesta_json(request, pacientes)
 
 @app.get("/pacientes/{paciente_id}", response_model=dict)
-async def obtener_paciente_endpoint(paciente_id: int):
+async def obtener_paciente_endpoint(paciente_id: int, request: Request, campos: Optional[str] = None):
     """Obtener un paciente específico por ID"""
-    paciente = crud.obtener_paciente(paciente_id)
-    if not paciente:
-        raise HTTPException(status_code=404, detail="Paciente no encontrado")
-    return paciente
+    return await _detalle(
+        request, crud.obtener_paciente, paciente_id, campos, no_encontrado="Paciente no encontrado"
+    )
 
 @app.put("/pacientes/{paciente_id}", response_model=dict)
 async def actualizar_paciente_endpoint(paciente_id: int, paciente: PacienteUpdate):
     """Actualizar un paciente existente"""
-    if not crud.obtener_paciente(paciente_id):
-        raise HTTPException(status_code=404, detail="Paciente no encontrado")
-    
-    if crud.actualizar_paciente(paciente_id, paciente):
-        return {"message": "Paciente actualizado exitosamente"}
-    raise HTTPException(status_code=400, detail="Error al actualizar el paciente")
+    await _modificar(
+        crud.actualizar_paciente, paciente_id, paciente,
+        no_encontrado="Paciente no encontrado", error="Error al actualizar el paciente"
+    )
+    return {"message": "Paciente actualizado exitosamente"}
 
 @app.delete("/pacientes/{paciente_id}", response_model=dict)
 async def eliminar_paciente_endpoint(paciente_id: int):
     """Eliminar un paciente"""
-    if not crud.obtener_paciente(paciente_id):
-        raise HTTPException(status_code=404, detail="Paciente no encontrado")
-    
-    if crud.eliminar_paciente(paciente_id):
-        return {"message": "Paciente eliminado exitosamente"}
-    raise HTTPException(status_code=400, detail="Error al eliminar el paciente")
+    await _modificar(
+        crud.eliminar_paciente, paciente_id,
+        no_encontrado="Paciente no encontrado", error="Error al eliminar el paciente"
+    )
+    return {"message": "Paciente eliminado exitosamente"}
 
 # ===========================================
 # Endpoints para Especialidad
@@ -83,43 +333,44 @@ async def eliminar_paciente_endpoint(paciente_id: int):
 @app.post("/especialidades/", response_model=dict, status_code=status.HTTP_201_CREATED)
 async def crear_especialidad_endpoint(especialidad: EspecialidadCreate):
     """Crear una nueva especialidad"""
-    especialidad_id = crud.crear_especialidad(especialidad)
+    especialidad_id = await run_db(crud.crear_especialidad, especialidad)
     if especialidad_id:
         return {"message": "Especialidad creada exitosamente", "id_especialidad": especialidad_id}
     raise HTTPException(status_code=400, detail="Error al crear la especialidad")
 
 @app.get("/especialidades/", response_model=List[dict])
-async def obtener_especialidades_endpoint():
+async def obtener_especialidades_endpoint(request: Request, campos: Optional[str] = None):
     """Obtener todas las especialidades"""
-    return crud.obtener_especialidades()
+    try:
+        especialidades = await _leer(crud.obtener_especialidades, _lista_campos(campos))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _respuesta_json(request, especialidades)
 
 @app.get("/especialidades/{especialidad_id}", response_model=dict)
-async def obtener_especialidad_endpoint(especialidad_id: int):
+async def obtener_especialidad_endpoint(especialidad_id: int, request: Request, campos: Optional[str] = None):
     """Obtener una especialidad específica por ID"""
-    especialidad = crud.obtener_especialidad(especialidad_id)
-    if not especialidad:
-        raise HTTPException(status_code=404, detail="Especialidad no encontrada")
-    return especialidad
+    return await _detalle(
+        request, crud.obtener_especialidad, especialidad_id, campos, no_encontrado="Especialidad no encontrada"
+    )
 
 @app.put("/especialidades/{especialidad_id}", response_model=dict)
 async def actualizar_especialidad_endpoint(especialidad_id: int, especialidad: EspecialidadUpdate):
     """Actualizar una especialidad existente"""
-    if not crud.obtener_especialidad(especialidad_id):
-        raise HTTPException(status_code=404, detail="Especialidad no encontrada")
-    
-    if crud.actualizar_especialidad(especialidad_id, especialidad):
-        return {"message": "Especialidad actualizada exitosamente"}
-    raise HTTPException(status_code=400, detail="Error al actualizar la especialidad")
+    await _modificar(
+        crud.actualizar_especialidad, especialidad_id, especialidad,
+        no_encontrado="Especialidad no encontrada", error="Error al actualizar la especialidad"
+    )
+    return {"message": "Especialidad actualizada exitosamente"}
 
 @app.delete("/especialidades/{especialidad_id}", response_model=dict)
 async def eliminar_especialidad_endpoint(especialidad_id: int):
     """Eliminar una especialidad"""
-    if not crud.obtener_especialidad(especialidad_id):
-        raise HTTPException(status_code=404, detail="Especialidad no encontrada")
-    
-    if crud.eliminar_especialidad(especialidad_id):
-        return {"message": "Especialidad eliminada exitosamente"}
-    raise HTTPException(status_code=400, detail="Error al eliminar la especialidad")
+    await _modificar(
+        crud.eliminar_especialidad, especialidad_id,
+        no_encontrado="Especialidad no encontrada", error="Error al eliminar la especialidad"
+    )
+    return {"message": "Especialidad eliminada exitosamente"}
 
 # ===========================================
 # Endpoints para Doctor
@@ -127,48 +378,62 @@ async def eliminar_especialidad_endpoint(especialidad_id: int):
 @app.post("/doctores/", response_model=dict, status_code=status.HTTP_201_CREATED)
 async def crear_doctor_endpoint(doctor: DoctorCreate):
     """Crear un nuevo doctor"""
-    doctor_id = crud.crear_doctor(doctor)
+    doctor_id = await run_db(crud.crear_doctor, doctor)
     if doctor_id:
         return {"message": "Doctor creado exitosamente", "id_doctor": doctor_id}
     raise HTTPException(status_code=400, detail="Error al crear el doctor")
 
 @app.get("/doctores/", response_model=List[dict])
-async def obtener_doctores_endpoint():
-    """Obtener todos los doctores"""
-    return crud.obtener_doctores()
+async def obtener_doctores_endpoint(
+    request: Request,
+    limite: int = Query(crud.LIMITE_POR_DEFECTO, ge=1, le=crud.LIMITE_MAXIMO),
+    cursor: Optional[str] = None,
+    campos: Optional[str] = None
+):
+    """Obtener los doctores, paginados por cursor"""
+    return await _listar_paginado(
+        request, crud.ORDEN_DOCTORES, crud.obtener_doctores,
+        limite=limite, cursor=cursor, campos=campos
+    )
 
 @app.get("/doctores/{doctor_id}", response_model=dict)
-async def obtener_doctor_endpoint(doctor_id: int):
+async def obtener_doctor_endpoint(doctor_id: int, request: Request, campos: Optional[str] = None):
     """Obtener un doctor específico por ID"""
-    doctor = crud.obtener_doctor(doctor_id)
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor no encontrado")
-    return doctor
+    return await _detalle(
+        request, crud.obtener_doctor, doctor_id, campos, no_encontrado="Doctor no encontrado"
+    )
 
 @app.get("/doctores/especialidad/{especialidad_id}", response_model=List[dict])
-async def obtener_doctores_por_especialidad_endpoint(especialidad_id: int):
-    """Obtener doctores por especialidad"""
-    return crud.obtener_doctores_por_especialidad(especialidad_id)
+async def obtener_doctores_por_especialidad_endpoint(
+    especialidad_id: int,
+    request: Request,
+    limite: int = Query(crud.LIMITE_POR_DEFECTO, ge=1, le=crud.LIMITE_MAXIMO),
+    cursor: Optional[str] = None,
+    campos: Optional[str] = None
+):
+    """Obtener doctores por especialidad, paginados por cursor"""
+    return await _listar_paginado(
+        request, crud.ORDEN_DOCTORES, crud.obtener_doctores_por_especialidad, especialidad_id,
+        limite=limite, cursor=cursor, campos=campos
+    )
 
 @app.put("/doctores/{doctor_id}", response_model=dict)
 async def actualizar_doctor_endpoint(doctor_id: int, doctor: DoctorUpdate):
     """Actualizar un doctor existente"""
-    if not crud.obtener_doctor(doctor_id):
-        raise HTTPException(status_code=404, detail="Doctor no encontrado")
-    
-    if crud.actualizar_doctor(doctor_id, doctor):
-        return {"message": "Doctor actualizado exitosamente"}
-    raise HTTPException(status_code=400, detail="Error al actualizar el doctor")
+    await _modificar(
+        crud.actualizar_doctor, doctor_id, doctor,
+        no_encontrado="Doctor no encontrado", error="Error al actualizar el doctor"
+    )
+    return {"message": "Doctor actualizado exitosamente"}
 
 @app.delete("/doctores/{doctor_id}", response_model=dict)
 async def eliminar_doctor_endpoint(doctor_id: int):
     """Eliminar un doctor"""
-    if not crud.obtener_doctor(doctor_id):
-        raise HTTPException(status_code=404, detail="Doctor no encontrado")
-    
-    if crud.eliminar_doctor(doctor_id):
-        return {"message": "Doctor eliminado exitosamente"}
-    raise HTTPException(status_code=400, detail="Error al eliminar el doctor")
+    await _modificar(
+        crud.eliminar_doctor, doctor_id,
+        no_encontrado="Doctor no encontrado", error="Error al eliminar el doctor"
+    )
+    return {"message": "Doctor eliminado exitosamente"}
 
 # ===========================================
 # Endpoints para Historial
@@ -176,97 +441,170 @@ async def eliminar_doctor_endpoint(doctor_id: int):
 @app.post("/historial/", response_model=dict, status_code=status.HTTP_201_CREATED)
 async def crear_historial_endpoint(historial: HistorialCreate):
     """Crear un nuevo registro de historial"""
-    historial_id = crud.crear_historial(historial)
+    historial_id = await run_db(crud.crear_historial, historial)
     if historial_id:
         return {"message": "Historial creado exitosamente", "id_historial": historial_id}
     raise HTTPException(status_code=400, detail="Error al crear el historial")
 
+@app.get("/historial/buscar", response_model=List[dict])
+async def buscar_historial_endpoint(
+    request: Request,
+    q: str = Query(..., min_length=crud.MIN_LETRAS_TERMINO, max_length=200),
+    id_paciente: Optional[int] = None,
+    id_doctor: Optional[int] = None,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    limite: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None
+):
+    """Buscar texto en diagnósticos, tratamientos y observaciones, de más a menos relevante"""
+    _validar_rango(desde, hasta)
+    try:
+        filas = await run_db(
+            crud.buscar_historial, q, id_paciente, id_doctor, desde, hasta, limite=limite, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    siguiente = crud.siguiente_cursor_busqueda(filas, limite, cursor)
+    return _respuesta_json(request, filas, {"X-Next-Cursor": siguiente} if siguiente else None)
+
 @app.get("/historial/{historial_id}", response_model=dict)
-async def obtener_historial_endpoint(historial_id: int):
+async def obtener_historial_endpoint(historial_id: int, request: Request, campos: Optional[str] = None):
     """Obtener un registro de historial específico por ID"""
-    historial = crud.obtener_historial(historial_id)
-    if not historial:
-        raise HTTPException(status_code=404, detail="Historial no encontrado")
-    return historial
+    return await _detalle(
+        request, crud.obtener_historial, historial_id, campos, no_encontrado="Historial no encontrado"
+    )
 
 @app.get("/historial/paciente/{paciente_id}", response_model=List[dict])
-async def obtener_historial_paciente_endpoint(paciente_id: int):
-    """Obtener historial médico de un paciente"""
-    return crud.obtener_historial_paciente(paciente_id)
+async def obtener_historial_paciente_endpoint(
+    paciente_id: int,
+    request: Request,
+    limite: int = Query(crud.LIMITE_POR_DEFECTO, ge=1, le=crud.LIMITE_MAXIMO),
+    cursor: Optional[str] = None,
+    campos: Optional[str] = None
+):
+    """Obtener historial médico de un paciente, del más reciente al más antiguo"""
+    return await _listar_paginado(
+        request, crud.ORDEN_HISTORIAL, crud.obtener_historial_paciente, paciente_id,
+        limite=limite, cursor=cursor, campos=campos
+    )
 
 @app.put("/historial/{historial_id}", response_model=dict)
 async def actualizar_historial_endpoint(historial_id: int, historial: HistorialUpdate):
     """Actualizar un registro de historial existente"""
-    if not crud.obtener_historial(historial_id):
-        raise HTTPException(status_code=404, detail="Historial no encontrado")
-    
-    if crud.actualizar_historial(historial_id, historial):
-        return {"message": "Historial actualizado exitosamente"}
-    raise HTTPException(status_code=400, detail="Error al actualizar el historial")
+    await _modificar(
+        crud.actualizar_historial, historial_id, historial,
+        no_encontrado="Historial no encontrado", error="Error al actualizar el historial"
+    )
+    return {"message": "Historial actualizado exitosamente"}
 
 @app.delete("/historial/{historial_id}", response_model=dict)
 async def eliminar_historial_endpoint(historial_id: int):
     """Eliminar un registro de historial"""
-    if not crud.obtener_historial(historial_id):
-        raise HTTPException(status_code=404, detail="Historial no encontrado")
-    
-    if crud.eliminar_historial(historial_id):
-        return {"message": "Historial eliminado exitosamente"}
-    raise HTTPException(status_code=400, detail="Error al eliminar el historial")
+    await _modificar(
+        crud.eliminar_historial, historial_id,
+        no_encontrado="Historial no encontrado", error="Error al eliminar el historial"
+    )
+    return {"message": "Historial eliminado exitosamente"}
 
 # ===========================================
 # Endpoints para Cita
 # ===========================================
 @app.post("/citas/", response_model=dict, status_code=status.HTTP_201_CREATED)
 async def crear_cita_endpoint(cita: CitaCreate):
-    """Crear una nueva cita"""
-    cita_id = crud.crear_cita(cita)
+    """Crear una nueva cita; responde 409 si el doctor ya tiene una cita en ese horario"""
+    try:
+        cita_id = await run_db(crud.crear_cita, cita)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="El doctor ya tiene una cita en ese horario")
     if cita_id:
         return {"message": "Cita creada exitosamente", "id_cita": cita_id}
     raise HTTPException(status_code=400, detail="Error al crear la cita")
 
+@app.post("/citas/bulk", response_model=dict, status_code=status.HTTP_201_CREATED)
+async def crear_citas_endpoint(
+    citas: List[dict],
+    tamano_lote: int = Query(crud.TAMANO_LOTE_INSERCION, ge=1, le=5000)
+):
+    """Crear varias citas en una sola transacción"""
+    return await _crear_en_lote(citas, CitaCreate, crud.crear_citas, "id_cita", tamano_lote)
+
 @app.get("/citas/", response_model=List[dict])
-async def obtener_citas_endpoint():
-    """Obtener todas las citas"""
-    return crud.obtener_citas()
+async def obtener_citas_endpoint(
+    request: Request,
+    limite: int = Query(crud.LIMITE_POR_DEFECTO, ge=1, le=crud.LIMITE_MAXIMO),
+    cursor: Optional[str] = None,
+    campos: Optional[str] = None
+):
+    """Obtener las citas, paginadas por cursor"""
+    return await _listar_paginado(
+        request, crud.ORDEN_CITAS, crud.obtener_citas,
+        limite=limite, cursor=cursor, campos=campos
+    )
 
 @app.get("/citas/{cita_id}", response_model=dict)
-async def obtener_cita_endpoint(cita_id: int):
+async def obtener_cita_endpoint(cita_id: int, request: Request, campos: Optional[str] = None):
     """Obtener una cita específica por ID"""
-    cita = crud.obtener_cita(cita_id)
-    if not cita:
-        raise HTTPException(status_code=404, detail="Cita no encontrada")
-    return cita
+    return await _detalle(
+        request, crud.obtener_cita, cita_id, campos, no_encontrado="Cita no encontrada"
+    )
 
 @app.get("/citas/paciente/{paciente_id}", response_model=List[dict])
-async def obtener_citas_paciente_endpoint(paciente_id: int):
-    """Obtener citas de un paciente específico"""
-    return crud.obtener_citas_paciente(paciente_id)
+async def obtener_citas_paciente_endpoint(
+    paciente_id: int,
+    request: Request,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    momento: Optional[str] = Query(None, pattern="^(pasadas|proximas)$"),
+    limite: int = Query(crud.LIMITE_POR_DEFECTO, ge=1, le=crud.LIMITE_MAXIMO),
+    cursor: Optional[str] = None,
+    campos: Optional[str] = None
+):
+    """Obtener citas de un paciente específico entre dos fechas (inclusive), paginadas por cursor"""
+    _validar_rango(desde, hasta)
+    return await _listar_paginado(
+        request, crud.ORDEN_CITAS, crud.obtener_citas_paciente, paciente_id, desde, hasta, momento,
+        limite=limite, cursor=cursor, campos=campos
+    )
 
 @app.get("/citas/doctor/{doctor_id}", response_model=List[dict])
-async def obtener_citas_doctor_endpoint(doctor_id: int):
-    """Obtener citas de un doctor específico"""
-    return crud.obtener_citas_doctor(doctor_id)
+async def obtener_citas_doctor_endpoint(
+    doctor_id: int,
+    request: Request,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    momento: Optional[str] = Query(None, pattern="^(pasadas|proximas)$"),
+    limite: int = Query(crud.LIMITE_POR_DEFECTO, ge=1, le=crud.LIMITE_MAXIMO),
+    cursor: Optional[str] = None,
+    campos: Optional[str] = None
+):
+    """Obtener citas de un doctor específico entre dos fechas (inclusive), paginadas por cursor"""
+    _validar_rango(desde, hasta)
+    return await _listar_paginado(
+        request, crud.ORDEN_CITAS, crud.obtener_citas_doctor, doctor_id, desde, hasta, momento,
+        limite=limite, cursor=cursor, campos=campos
+    )
 
 @app.put("/citas/{cita_id}", response_model=dict)
 async def actualizar_cita_endpoint(cita_id: int, cita: CitaUpdate):
     """Actualizar una cita existente"""
-    if not crud.obtener_cita(cita_id):
-        raise HTTPException(status_code=404, detail="Cita no encontrada")
-    
-    if crud.actualizar_cita(cita_id, cita):
-        return {"message": "Cita actualizada exitosamente"}
-    raise HTTPException(status_code=400, detail="Error al actualizar la cita")
+    try:
+        await _modificar(
+            crud.actualizar_cita, cita_id, cita,
+            no_encontrado="Cita no encontrada", error="Error al actualizar la cita"
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="El doctor ya tiene una cita en ese horario")
+    return {"message": "Cita actualizada exitosamente"}
 
 @app.delete("/citas/{cita_id}", response_model=dict)
 async def eliminar_cita_endpoint(cita_id: int):
     """Cancelar/eliminar una cita"""
-    if not crud.obtener_cita(cita_id):
-        raise HTTPException(status_code=404, detail="Cita no encontrada")
-    
-    if crud.eliminar_cita(cita_id):
-        return {"message": "Cita cancelada exitosamente"}
-    raise HTTPException(status_code=400, detail="Error al cancelar la cita")
+    await _modificar(
+        crud.eliminar_cita, cita_id,
+        no_encontrado="Cita no encontrada", error="Error al cancelar la cita"
+    )
+    return {"message": "Cita cancelada exitosamente"}
 
 # ===========================================
 # Endpoints para Disponibilidad
@@ -278,7 +616,32 @@ async def obtener_disponibilidad_endpoint(
     id_especialidad: Optional[int] = None
 ):
     """Obtener horarios disponibles para una fecha específica"""
-    return crud.obtener_horarios_disponibles(fecha, id_doctor, id_especialidad)
+    return await _leer(crud.obtener_horarios_disponibles, fecha, id_doctor, id_especialidad)
+
+@app.get("/disponibilidad/calendario/", response_model=dict)
+async def obtener_calendario_disponibilidad_endpoint(
+    fecha_desde: date,
+    fecha_hasta: date,
+    id_doctor: Optional[int] = None,
+    id_especialidad: Optional[int] = None,
+    formato: str = Query("horarios", pattern="^(horarios|mascara)$")
+):
+    """Obtener los horarios disponibles por día y doctor en un rango de fechas"""
+    if fecha_hasta < fecha_desde:
+        raise HTTPException(status_code=400, detail="fecha_hasta debe ser posterior o igual a fecha_desde")
+    if (fecha_hasta - fecha_desde).days >= crud.MAX_DIAS_CALENDARIO:
+        raise HTTPException(
+            status_code=400,
+            detail=f"El rango no puede superar {crud.MAX_DIAS_CALENDARIO} días"
+        )
+
+    calendario = await _leer(
+        crud.obtener_calendario_disponibilidad,
+        fecha_desde, fecha_hasta, id_doctor, id_especialidad, formato == "mascara"
+    )
+    if calendario is None:
+        raise HTTPException(status_code=400, detail="Error al obtener la disponibilidad")
+    return calendario
 
 @app.get("/disponibilidad/verificar/")
 async def verificar_disponibilidad_endpoint(
@@ -287,7 +650,7 @@ async def verificar_disponibilidad_endpoint(
     hora: str
 ):
     """Verificar si un doctor está disponible en una fecha y hora específica"""
-    disponible = crud.verificar_disponibilidad(fecha, id_doctor, hora)
+    disponible = await run_db(crud.verificar_disponibilidad, fecha, id_doctor, hora)
     return {
         "fecha": fecha,
         "id_doctor": id_doctor,
@@ -295,9 +658,84 @@ async def verificar_disponibilidad_endpoint(
         "disponible": disponible
     }
 
+# ===========================================
+# Endpoints de exportación
+# ===========================================
+def _ndjson(bloque: List[dict]) -> str:
+    return "".join(json.dumps(fila, default=_valor_json, ensure_ascii=False) + "\n" for fila in bloque)
+
+def _csv(bloque: List[dict], encabezado: bool) -> str:
+    salida = io.StringIO()
+    writer = csv.DictWriter(salida, fieldnames=list(bloque[0].keys()))
+    if encabezado:
+        writer.writeheader()
+    writer.writerows(bloque)
+    return salida.getvalue()
+
+async def _exportar(bloque, bloques, formato: str):
+    """Formatea los bloques de filas leyéndolos desde el executor de base de datos.
+
+    Un error a mitad de camino se propaga y corta la respuesta, así el cliente
+    no recibe un archivo truncado que parece completo.
+    """
+    # next() y close() no pueden ejecutarse a la vez sobre el mismo generador
+    lock = threading.Lock()
+
+    def siguiente():
+        with lock:
+            return next(bloques, None)
+
+    def cerrar():
+        with lock:
+            bloques.close()
+
+    primero = True
+    try:
+        while bloque is not None:
+            yield _ndjson(bloque) if formato == "ndjson" else _csv(bloque, primero)
+            primero = False
+            bloque = await run_db(siguiente)
+    finally:
+        # Si el cliente se desconectó la tarea está cancelada y un await aquí no
+        # llegaría a ejecutarse: el cierre se encola en el executor sin esperarlo y
+        # el lock lo deja para después del next() que siga en curso. Así la
+        # conexión vuelve al pool sin depender de que el generador se recolecte
+        get_executor().submit(cerrar)
+
+async def _respuesta_exportacion(bloques, formato: str, nombre: str) -> StreamingResponse:
+    # La conexión y la consulta se resuelven antes de enviar los encabezados:
+    # si fallan, la respuesta es un 503 y no un 200 vacío
+    try:
+        bloque = await run_db(next, bloques, None)
+    except DatabaseError:
+        await run_db(bloques.close)
+        raise HTTPException(status_code=503, detail="No se pudo leer la base de datos para la exportación")
+    media_type = "application/x-ndjson" if formato == "ndjson" else "text/csv"
+    return StreamingResponse(
+        _exportar(bloque, bloques, formato),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{nombre}.{formato}"'}
+    )
+
+@app.get("/exportar/citas")
+async def exportar_citas_endpoint(formato: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    """Exportar todas las citas en NDJSON o CSV (respuesta en streaming)"""
+    return await _respuesta_exportacion(crud.exportar_citas(), formato, "citas")
+
+@app.get("/exportar/historial")
+async def exportar_historial_endpoint(formato: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    """Exportar todo el historial médico en NDJSON o CSV (respuesta en streaming)"""
+    return await _respuesta_exportacion(crud.exportar_historial(), formato, "historial")
+
 # ===========================================
 # Endpoint de salud
 # ===========================================
+@app.get("/metrics", include_in_schema=False)
+async def metricas():
+    """Métricas en formato Prometheus"""
+    contenido, content_type = metrics.render()
+    return Response(content=contenido, media_type=content_type)
+
 @app.get("/")
 async def root():
     """Endpoint raíz con información de la API"""
@@ -316,8 +754,8 @@ async def root():
     }
 
 if __name__ == "__main__":
+    # Modo desarrollo (un solo proceso). En producción: gunicorn main:app -c gunicorn.conf.py
     import uvicorn
-    import os
     
     port = int(os.getenv("PORT", 8000))
     uvicorn.run(app, host="0.0.0.0", port=port)
@@ -0,0 +1,106 @@
+"""
+Métricas de Prometheus de la API: peticiones HTTP, consultas a la base de
+datos, pool de conexiones y cachés.
+
+Con varios workers de gunicorn, PROMETHEUS_MULTIPROC_DIR debe apuntar a un
+directorio vacío: cada worker escribe ahí sus métricas y /metrics las suma.
+Las del pool y las cachés son de cada proceso y se reportan con el pid del
+worker que atiende la petición a /metrics.
+"""
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from typing import Tuple
+import os
+
+import database
+from cache import get_cache_stats
+
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Duración de las peticiones HTTP",
+    ["method", "route"]
+)
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "Peticiones HTTP por código de estado",
+    ["method", "route", "status"]
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Duración de las consultas a la base de datos, por función de crud",
+    ["function"],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5)
+)
+DB_QUERY_ERRORS = Counter(
+    "db_query_errors_total",
+    "Consultas a la base de datos que fallaron, por función de crud",
+    ["function"]
+)
+DB_POOL_ACQUIRE_DURATION = Histogram(
+    "db_pool_acquire_duration_seconds",
+    "Tiempo para obtener una conexión del pool",
+    buckets=(.0001, .0005, .001, .005, .01, .05, .1, .5, 1, 5, 10)
+)
+
+def _observe_query(query: str, elapsed: float, failed: bool):
+    function = database.calling_function()
+    DB_QUERY_DURATION.labels(function).observe(elapsed)
+    if failed:
+        DB_QUERY_ERRORS.labels(function).inc()
+
+database.add_query_listener(_observe_query)
+database.add_acquire_listener(DB_POOL_ACQUIRE_DURATION.observe)
+
+def observe_request(method: str, route: str, status: int, elapsed: float):
+    """Registra una petición; route es la plantilla de la ruta (p. ej. /citas/{cita_id})"""
+    HTTP_REQUEST_DURATION.labels(method, route).observe(elapsed)
+    HTTP_REQUESTS.labels(method, route, str(status)).inc()
+
+class _StateCollector:
+    """Estado del pool y de las cachés, leído en el momento de cada consulta a /metrics"""
+
+    def collect(self):
+        labels = ["pid"]
+        pid = str(os.getpid())
+
+        pool = database.get_pool_stats()
+        for name in ("size", "idle", "in_use", "max_size"):
+            gauge = GaugeMetricFamily(f"db_pool_{name}", f"Conexiones del pool: {name}", labels=labels)
+            gauge.add_metric([pid], pool[name])
+            yield gauge
+        for name in ("created", "waits", "timeouts", "health_check_failures", "connect_errors"):
+            counter = CounterMetricFamily(f"db_pool_{name}", f"Eventos del pool: {name}", labels=labels)
+            counter.add_metric([pid], pool[name])
+            yield counter
+
+        caches = get_cache_stats()
+        for name in ("hits", "misses", "evictions", "invalidations"):
+            counter = CounterMetricFamily(f"cache_{name}", f"Caché: {name}", labels=["cache", "pid"])
+            for cache, stats in caches.items():
+                counter.add_metric([cache, pid], stats[name])
+            yield counter
+        size = GaugeMetricFamily("cache_size", "Entradas en la caché", labels=["cache", "pid"])
+        for cache, stats in caches.items():
+            size.add_metric([cache, pid], stats["size"])
+        yield size
+
+if MULTIPROCESS:
+    _registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(_registry)
+else:
+    _registry = REGISTRY
+_registry.register(_StateCollector())
+
+def render() -> Tuple[bytes, str]:
+    """Métricas en el formato de texto de Prometheus y su content type"""
+    return generate_latest(_registry), CONTENT_TYPE_LATEST
+
+def mark_process_dead(pid: int):
+    """Descarta las métricas en vivo de un worker terminado (hook child_exit de gunicorn)"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid)
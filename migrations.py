@@ -0,0 +1,184 @@
+"""
+Migraciones versionadas del esquema de la base de datos.
+
+Cada migración es (versión, descripción, pasos). Un paso es una sentencia SQL,
+una función que recibe el cursor o un dict motor -> sentencia cuando la
+sintaxis de MySQL y SQLite difiere (un motor sin entrada omite el paso). Las versiones aplicadas se registran en la
+tabla schema_version; al iniciar solo se ejecutan las pendientes.
+
+Las migraciones nunca se modifican una vez publicadas: los cambios de esquema
+se agregan como una migración nueva al final de la lista.
+
+Un paso puede lanzar MigracionPospuesta cuando los datos existentes impiden
+aplicarla: esa migración no se registra, las siguientes se aplican igual y se
+vuelve a intentar en el próximo inicio.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION_TABLE = """CREATE TABLE IF NOT EXISTS schema_version (
+    version INT PRIMARY KEY,
+    descripcion VARCHAR(200) NOT NULL,
+    aplicada_en DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+)"""
+
+class MigracionPospuesta(Exception):
+    """Los datos actuales impiden aplicar la migración; se reintenta en el próximo inicio"""
+
+def _insertar_datos_ejemplo(cursor):
+    """Datos de ejemplo, solo si la base de datos está vacía"""
+    cursor.execute("SELECT COUNT(*) FROM especialidad")
+    if cursor.fetchone()[0] > 0:
+        logger.info("Los datos de ejemplo ya existen")
+        return
+
+    logger.info("Insertando datos de ejemplo")
+
+    especialidades = [
+        ('Cardiología', 'Especialidad médica que se encarga del diagnóstico y tratamiento de las enfermedades del corazón'),
+        ('Dermatología', 'Especialidad médica que se encarga del diagnóstico y tratamiento de las enfermedades de la piel'),
+        ('Pediatría', 'Especialidad médica que se encarga del cuidado de la salud de los niños'),
+        ('Ginecología', 'Especialidad médica que se encarga de la salud del sistema reproductor femenino'),
+        ('Ortopedia', 'Especialidad médica que se encarga del diagnóstico y tratamiento de lesiones y enfermedades del sistema musculoesquelético')
+    ]
+    cursor.executemany("INSERT INTO especialidad (nombre, descripcion) VALUES (%s, %s)", especialidades)
+
+    doctores = [
+        ('María', 'García', '3001234567', 'maria.garcia@clinica.com', 1),
+        ('Carlos', 'Rodríguez', '3002345678', 'carlos.rodriguez@clinica.com', 2),
+        ('Ana', 'López', '3003456789', 'ana.lopez@clinica.com', 3),
+        ('Luis', 'Martínez', '3004567890', 'luis.martinez@clinica.com', 4),
+        ('Patricia', 'Hernández', '3005678901', 'patricia.hernandez@clinica.com', 5)
+    ]
+    cursor.executemany("INSERT INTO doctor (nombre, apellido, telefono, email, id_especialidad) VALUES (%s, %s, %s, %s, %s)", doctores)
+
+    pacientes = [
+        ('Juan', 'Pérez', '1990-05-15', '3001111111', 'juan.perez@email.com', 'Calle 123 #45-67'),
+        ('María', 'González', '1985-08-22', '3002222222', 'maria.gonzalez@email.com', 'Carrera 78 #90-12'),
+        ('Pedro', 'Sánchez', '1995-03-10', '3003333333', 'pedro.sanchez@email.com', 'Avenida 5 #23-45'),
+        ('Ana', 'Ramírez', '1988-12-05', '3004444444', 'ana.ramirez@email.com', 'Calle 67 #89-01'),
+        ('Luis', 'Torres', '1992-07-18', '3005555555', 'luis.torres@email.com', 'Carrera 34 #56-78')
+    ]
+    cursor.executemany("INSERT INTO paciente (nombre, apellido, fecha_nacimiento, telefono, email, direccion) VALUES (%s, %s, %s, %s, %s, %s)", pacientes)
+
+    citas = [
+        ('2024-01-15 10:00:00', 'Consulta de rutina', 1, 1),
+        ('2024-01-15 14:30:00', 'Revisión de piel', 2, 2),
+        ('2024-01-16 09:00:00', 'Control pediátrico', 3, 3),
+        ('2024-01-16 11:30:00', 'Consulta ginecológica', 4, 4),
+        ('2024-01-17 15:00:00', 'Revisión ortopédica', 5, 5)
+    ]
+    cursor.executemany("INSERT INTO cita (fecha_hora, motivo, id_paciente, id_doctor) VALUES (%s, %s, %s, %s)", citas)
+
+    historiales = [
+        ('2024-01-10', 'Hipertensión arterial', 'Enalapril 10mg diario', 'Paciente con presión arterial elevada', 1, 1),
+        ('2024-01-12', 'Dermatitis atópica', 'Cremas hidratantes y antihistamínicos', 'Paciente con piel seca y picazón', 2, 2),
+        ('2024-01-08', 'Resfriado común', 'Reposo y líquidos abundantes', 'Paciente con síntomas leves', 3, 3),
+        ('2024-01-05', 'Control ginecológico normal', 'Sin tratamiento requerido', 'Paciente en buen estado de salud', 4, 4),
+        ('2024-01-03', 'Esguince de tobillo', 'Reposo, hielo y elevación', 'Paciente con lesión deportiva', 5, 5)
+    ]
+    cursor.executemany("INSERT INTO historial (fecha, diagnostico, tratamiento, observaciones, id_paciente, id_doctor) VALUES (%s, %s, %s, %s, %s, %s)", historiales)
+
+    logger.info("Datos de ejemplo insertados")
+
+def _verificar_reservas_unicas(cursor):
+    """El índice único de reservas no se puede crear si ya hay horarios con dos citas"""
+    cursor.execute(
+        "SELECT id_doctor, fecha_hora, COUNT(*) FROM cita "
+        "GROUP BY id_doctor, fecha_hora HAVING COUNT(*) > 1 "
+        "ORDER BY id_doctor, fecha_hora LIMIT 20"
+    )
+    duplicados = cursor.fetchall()
+    if duplicados:
+        horarios = ", ".join(
+            f"doctor {id_doctor} el {fecha_hora} ({citas} citas)" for id_doctor, fecha_hora, citas in duplicados
+        )
+        raise MigracionPospuesta(
+            f"hay horarios reservados más de una vez: {horarios}. Mientras existan, las reservas "
+            "no están protegidas contra duplicados; elimina o reprograma las citas sobrantes y reinicia"
+        )
+
+MIGRACIONES = [
+    (1, "Tablas iniciales", [
+        """CREATE TABLE IF NOT EXISTS paciente (
+            id_paciente INT AUTO_INCREMENT PRIMARY KEY,
+            nombre VARCHAR(100) NOT NULL,
+            apellido VARCHAR(100) NOT NULL,
+            fecha_nacimiento DATE NOT NULL,
+            telefono VARCHAR(20) UNIQUE,
+            email VARCHAR(120) UNIQUE,
+            direccion VARCHAR(200)
+        )""",
+        """CREATE TABLE IF NOT EXISTS especialidad (
+            id_especialidad INT AUTO_INCREMENT PRIMARY KEY,
+            nombre VARCHAR(100) NOT NULL,
+            descripcion TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS doctor (
+            id_doctor INT AUTO_INCREMENT PRIMARY KEY,
+            nombre VARCHAR(100) NOT NULL,
+            apellido VARCHAR(100) NOT NULL,
+            telefono VARCHAR(20),
+            email VARCHAR(150) UNIQUE,
+            id_especialidad INT NOT NULL,
+            FOREIGN KEY (id_especialidad) REFERENCES especialidad(id_especialidad)
+        )""",
+        """CREATE TABLE IF NOT EXISTS historial (
+            id_historial INT AUTO_INCREMENT PRIMARY KEY,
+            fecha DATE NOT NULL,
+            diagnostico TEXT,
+            tratamiento TEXT,
+            observaciones TEXT,
+            id_paciente INT NOT NULL,
+            id_doctor INT NOT NULL,
+            FOREIGN KEY (id_paciente) REFERENCES paciente(id_paciente),
+            FOREIGN KEY (id_doctor) REFERENCES doctor(id_doctor)
+        )""",
+        """CREATE TABLE IF NOT EXISTS cita (
+            id_cita INT AUTO_INCREMENT PRIMARY KEY,
+            fecha_hora DATETIME NOT NULL,
+            motivo VARCHAR(255),
+            id_paciente INT,
+            id_doctor INT,
+            FOREIGN KEY (id_paciente) REFERENCES paciente(id_paciente),
+            FOREIGN KEY (id_doctor) REFERENCES doctor(id_doctor)
+        )"""
+    ]),
+    (2, "Datos de ejemplo", [_insertar_datos_ejemplo]),
+    (3, "Índices de consultas", [
+        "CREATE INDEX idx_cita_fecha_hora ON cita(fecha_hora)",
+        "CREATE INDEX idx_cita_paciente ON cita(id_paciente)",
+        "CREATE INDEX idx_cita_doctor ON cita(id_doctor)",
+        "CREATE INDEX idx_historial_paciente ON historial(id_paciente)",
+        "CREATE INDEX idx_historial_fecha ON historial(fecha)",
+        "CREATE INDEX idx_doctor_especialidad ON doctor(id_especialidad)"
+    ]),
+    (4, "Reserva única por doctor y horario", [
+        # Con reservas duplicadas (bases anteriores a la restricción) se pospone
+        # y se conserva el índice no único que tuvieran
+        _verificar_reservas_unicas,
+        # Un doctor no puede tener dos citas a la misma hora: la base de datos
+        # rechaza la reserva duplicada aunque lleguen a la vez
+        "CREATE UNIQUE INDEX uq_cita_doctor_fecha_hora ON cita(id_doctor, fecha_hora)",
+        # Reemplazado por el índice único (bases MySQL creadas antes de las migraciones)
+        {"mysql": "DROP INDEX idx_cita_doctor_fecha_hora ON cita"}
+    ]),
+    (5, "Búsqueda de texto en el historial", [
+        # SQLite no tiene FULLTEXT: crud.buscar_historial usa LIKE en ese motor
+        {"mysql": "CREATE FULLTEXT INDEX ft_historial_texto ON historial(diagnostico, tratamiento, observaciones)"}
+    ]),
+    (6, "Búsqueda de pacientes por prefijo", [
+        # telefono y email ya tienen índice por su restricción UNIQUE
+        "CREATE INDEX idx_paciente_apellido_nombre ON paciente(apellido, nombre)",
+        "CREATE INDEX idx_paciente_nombre ON paciente(nombre)"
+    ]),
+    (7, "Citas de un paciente por fecha", [
+        "CREATE INDEX idx_cita_paciente_fecha_hora ON cita(id_paciente, fecha_hora)",
+        # El índice compuesto cubre las búsquedas (y la clave foránea) por id_paciente
+        {"mysql": "DROP INDEX idx_cita_paciente ON cita", "sqlite": "DROP INDEX idx_cita_paciente"}
+    ])
+]
+
+ULTIMA_VERSION = MIGRACIONES[-1][0]
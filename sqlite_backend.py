@@ -0,0 +1,185 @@
+"""
+Motor SQLite con la misma interfaz que las conexiones de PyMySQL.
+
+Permite ejecutar la API, las pruebas y los benchmarks sin un servidor MySQL
+(DB_BACKEND=sqlite). Las conexiones traducen los placeholders %s a ?, los
+tipos DATE/DATETIME a date/datetime y los errores de sqlite3 a los de PyMySQL,
+así que el pool y las funciones de database.py funcionan sin cambios.
+"""
+
+from datetime import date, datetime
+from functools import lru_cache
+import re
+import sqlite3
+import threading
+
+import pymysql
+from pymysql.constants import ER
+from pymysql.cursors import DictCursorMixin
+
+# Las fechas se guardan como texto ISO: se comparan y ordenan igual que en MySQL
+sqlite3.register_adapter(date, lambda valor: valor.isoformat())
+sqlite3.register_adapter(datetime, lambda valor: valor.isoformat(" "))
+sqlite3.register_converter("DATE", lambda valor: date.fromisoformat(valor.decode()))
+sqlite3.register_converter("DATETIME", lambda valor: datetime.fromisoformat(valor.decode()))
+
+# Sintaxis de MySQL usada por el esquema y los scripts -> equivalente en SQLite
+_TRADUCCIONES = [
+    (re.compile(r"\bINT AUTO_INCREMENT PRIMARY KEY\b", re.IGNORECASE), "INTEGER PRIMARY KEY AUTOINCREMENT"),
+    (re.compile(r"^\s*INSERT IGNORE\b", re.IGNORECASE), "INSERT OR IGNORE")
+]
+_PLACEHOLDER = re.compile(r"%([s%])")
+
+# Las bases en memoria viven mientras alguna conexión siga abierta; esta
+# conexión las mantiene aunque el pool cierre o descarte las suyas
+_memoria = {}
+_memoria_lock = threading.Lock()
+
+def is_memory(path: str) -> bool:
+    return path == ":memory:"
+
+@lru_cache(maxsize=1024)
+def _traducir(query: str, con_params: bool) -> str:
+    """Adapta una consulta escrita para PyMySQL a SQLite"""
+    for patron, reemplazo in _TRADUCCIONES:
+        query = patron.sub(reemplazo, query)
+    if con_params:
+        # PyMySQL usa formato de Python: %s es un parámetro y %% un % literal
+        query = _PLACEHOLDER.sub(lambda m: "?" if m.group(1) == "s" else "%", query)
+    return query
+
+# Mensajes de sqlite3.IntegrityError -> código de error de MySQL
+_CODIGOS_INTEGRIDAD = (
+    ("UNIQUE constraint failed", ER.DUP_ENTRY),
+    ("NOT NULL constraint failed", ER.BAD_NULL_ERROR),
+    ("FOREIGN KEY constraint failed", ER.NO_REFERENCED_ROW_2)
+)
+
+def _error_pymysql(error: sqlite3.Error) -> pymysql.Error:
+    """Error de PyMySQL equivalente, con el código de MySQL cuando el código lo consulta"""
+    mensaje = str(error)
+    if isinstance(error, sqlite3.IntegrityError):
+        # Sin equivalente (p. ej. CHECK) se usa 0 y el motivo queda genérico
+        codigo = next(
+            (codigo for prefijo, codigo in _CODIGOS_INTEGRIDAD if mensaje.startswith(prefijo)), 0
+        )
+        return pymysql.IntegrityError(codigo, mensaje)
+    if isinstance(error, sqlite3.OperationalError):
+        if mensaje.startswith("no such table"):
+            return pymysql.ProgrammingError(ER.NO_SUCH_TABLE, mensaje)
+        return pymysql.OperationalError(0, mensaje)
+    if isinstance(error, sqlite3.ProgrammingError):
+        return pymysql.InterfaceError(0, mensaje)
+    return pymysql.DatabaseError(0, mensaje)
+
+def _fila_dict(cursor, fila) -> dict:
+    return {columna[0]: valor for columna, valor in zip(cursor.description, fila)}
+
+class SQLiteCursor:
+    """Cursor con la interfaz de los cursores de PyMySQL usada en el proyecto"""
+
+    def __init__(self, cursor: sqlite3.Cursor, como_dict: bool):
+        self._cursor = cursor
+        if como_dict:
+            self._cursor.row_factory = _fila_dict
+        self.lastrowid = None
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    def execute(self, query: str, params=None):
+        try:
+            self._cursor.execute(_traducir(query, params is not None), tuple(params or ()))
+        except sqlite3.Error as e:
+            raise _error_pymysql(e) from e
+        self.lastrowid = self._cursor.lastrowid
+        if self._cursor.rowcount > 1 and query.lstrip()[:6].upper() == "INSERT":
+            # MySQL reporta el id de la primera fila de un INSERT de varias
+            # filas; SQLite, el de la última (los ids son consecutivos)
+            self.lastrowid -= self._cursor.rowcount - 1
+        return self._cursor.rowcount
+
+    def executemany(self, query: str, params):
+        try:
+            self._cursor.executemany(_traducir(query, True), [tuple(fila) for fila in params])
+        except sqlite3.Error as e:
+            raise _error_pymysql(e) from e
+        return self._cursor.rowcount
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size: int):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+class SQLiteConnection:
+    """Conexión SQLite en autocommit con la interfaz de las conexiones de PyMySQL"""
+
+    def __init__(self, connection: sqlite3.Connection):
+        self._connection = connection
+        self.open = True
+
+    def cursor(self, cursor_class=None) -> SQLiteCursor:
+        como_dict = cursor_class is not None and issubclass(cursor_class, DictCursorMixin)
+        return SQLiteCursor(self._connection.cursor(), como_dict)
+
+    def begin(self):
+        self._connection.execute("BEGIN")
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def ping(self, reconnect: bool = False):
+        if not self.open:
+            raise pymysql.InterfaceError(0, "La conexión está cerrada")
+        try:
+            self._connection.execute("SELECT 1")
+        except sqlite3.Error as e:
+            raise _error_pymysql(e) from e
+
+    def close(self):
+        self.open = False
+        self._connection.close()
+
+def _abrir(path: str, busy_timeout: float) -> sqlite3.Connection:
+    """Conexión sqlite3 compartible entre hilos (el pool la presta a uno a la vez)"""
+    if is_memory(path):
+        # Caché compartida: todas las conexiones del proceso ven la misma base
+        database, uri = "file:sistema_citas?mode=memory&cache=shared", True
+    else:
+        database, uri = path, False
+    connection = sqlite3.connect(
+        database,
+        uri=uri,
+        timeout=busy_timeout,
+        isolation_level=None,
+        check_same_thread=False,
+        detect_types=sqlite3.PARSE_DECLTYPES
+    )
+    connection.execute("PRAGMA foreign_keys = ON")
+    return connection
+
+def connect(path: str = ":memory:", busy_timeout: float = 10) -> SQLiteConnection:
+    """Abre una conexión a la base SQLite 'path' (":memory:" = en memoria del proceso)"""
+    try:
+        if is_memory(path):
+            with _memoria_lock:
+                if path not in _memoria:
+                    _memoria[path] = _abrir(path, busy_timeout)
+        connection = _abrir(path, busy_timeout)
+        if not is_memory(path):
+            # WAL: las lecturas no se bloquean mientras otra conexión escribe
+            connection.execute("PRAGMA journal_mode = WAL")
+    except sqlite3.Error as e:
+        raise _error_pymysql(e) from e
+    return SQLiteConnection(connection)
@@ -0,0 +1,46 @@
+"""
+Pruebas de las migraciones del esquema sobre una base SQLite en un archivo temporal.
+"""
+
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("pymysql")
+
+import database
+from migrations import MIGRACIONES, ULTIMA_VERSION
+
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    """Base SQLite vacía en un archivo propio de la prueba"""
+    database.close_pool()
+    monkeypatch.setattr(database, "DB_BACKEND", "sqlite")
+    monkeypatch.setattr(database, "SQLITE_PATH", str(tmp_path / "citas.db"))
+    yield monkeypatch
+    database.close_pool()
+
+def versiones():
+    return {fila["version"] for fila in database.execute_query("SELECT version FROM schema_version", fetch=True)}
+
+def test_reservas_duplicadas_posponen_solo_su_migracion(sqlite_db):
+    """Con dos citas en el mismo horario la migración 4 se pospone, las siguientes se
+    aplican y la 4 se completa en el inicio siguiente a la corrección de los datos"""
+    sqlite_db.setattr(database, "MIGRACIONES", MIGRACIONES[:3])
+    assert database.initialize_database()
+    ids = database.insert_many(
+        "cita", ["fecha_hora", "id_paciente", "id_doctor"],
+        [(datetime(2030, 1, 7, 9, 0), 1, 1), (datetime(2030, 1, 7, 9, 0), 2, 1)]
+    )
+    sqlite_db.setattr(database, "MIGRACIONES", MIGRACIONES)
+
+    assert database.initialize_database()
+    aplicadas = versiones()
+    assert 4 not in aplicadas
+    assert ULTIMA_VERSION in aplicadas
+
+    database.execute_update("DELETE FROM cita WHERE id_cita = %s", (ids[1],))
+    assert database.initialize_database()
+    assert versiones() == {version for version, _, _ in MIGRACIONES}
+    with pytest.raises(database.DuplicateKeyError):
+        database.insert_many("cita", ["fecha_hora", "id_paciente", "id_doctor"], [(datetime(2030, 1, 7, 9, 0), 3, 1)])
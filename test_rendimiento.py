@@ -0,0 +1,466 @@
+"""
+Pruebas de regresión de rendimiento: número de consultas por operación.
+
+Usan el motor SQLite en memoria, así que no necesitan un servidor MySQL.
+"""
+
+import asyncio
+import base64
+from contextlib import closing
+from datetime import date, datetime, timedelta
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pymysql")
+pytest.importorskip("pydantic")
+
+import crud
+import database
+from models import CitaCreate, EspecialidadCreate, EspecialidadUpdate, PacienteCreate, PacienteUpdate
+
+DOCTORES = 50
+FECHA = date(2030, 3, 4)
+
+@pytest.fixture(scope="module", autouse=True)
+def sqlite_db():
+    """Base SQLite en memoria con el esquema de las migraciones y 50 doctores de una especialidad"""
+    monkeypatch = pytest.MonkeyPatch()
+    database.close_pool()
+    monkeypatch.setattr(database, "DB_BACKEND", "sqlite")
+    monkeypatch.setattr(database, "SQLITE_PATH", ":memory:")
+    assert database.initialize_database()
+
+    id_especialidad = database.insert_many("especialidad", ["nombre"], [("Medicina General",)])[0]
+    doctores = database.insert_many(
+        "doctor", ["nombre", "apellido", "email", "id_especialidad"],
+        [(f"Doctor{i}", "Prueba", f"doctor{i}@prueba.com", id_especialidad) for i in range(DOCTORES)]
+    )
+    # Cada doctor tiene ocupado su primer horario del día
+    database.insert_many(
+        "cita", ["fecha_hora", "id_paciente", "id_doctor"],
+        [(datetime(2030, 3, 4, 8, 0), 1, id_doctor) for id_doctor in doctores]
+    )
+    crud.invalidar_catalogo()
+    yield id_especialidad
+
+    crud.invalidar_catalogo()
+    database.close_pool()
+    monkeypatch.undo()
+
+def test_disponibilidad_del_dia_usa_consultas_constantes(sqlite_db):
+    """Doctores y citas del día se leen con una consulta cada uno, sin importar cuántos doctores haya"""
+    with database.track_queries() as stats:
+        disponibilidad = crud.obtener_horarios_disponibles(FECHA, id_especialidad=sqlite_db)
+
+    assert len(disponibilidad) == DOCTORES
+    assert all("08:00" not in doctor["horarios_disponibles"] for doctor in disponibilidad)
+    assert stats.queries <= 2
+
+def test_calendario_usa_consultas_constantes(sqlite_db):
+    """Un calendario de dos semanas cuesta lo mismo que un solo día"""
+    with database.track_queries() as stats:
+        calendario = crud.obtener_calendario_disponibilidad(
+            FECHA, FECHA + timedelta(days=13), id_especialidad=sqlite_db, compacto=True
+        )
+
+    assert len(calendario["doctores"]) == DOCTORES
+    # Los doctores de la especialidad ya están en la caché de catálogos
+    assert stats.queries <= 1
+
+def test_listado_paginado_es_una_consulta():
+    """Cada página de un listado es una sola consulta"""
+    with database.track_queries() as stats:
+        primera = crud.obtener_pacientes(limite=2)
+        cursor = crud.siguiente_cursor(primera, 2, crud.ORDEN_PACIENTES)
+        segunda = crud.obtener_pacientes(limite=2, cursor=cursor)
+
+    assert stats.queries == 2
+    assert not {p["id_paciente"] for p in primera} & {p["id_paciente"] for p in segunda}
+
+def test_crud_y_reserva_duplicada():
+    """El motor SQLite respeta el contrato de database.py: filas afectadas y claves duplicadas"""
+    id_paciente = crud.crear_paciente(PacienteCreate(
+        nombre="Ana", apellido="Prueba", fecha_nacimiento=date(1990, 1, 1), email="ana@prueba.com"
+    ))
+    assert crud.obtener_paciente(id_paciente)["fecha_nacimiento"] == date(1990, 1, 1)
+    assert crud.actualizar_paciente(id_paciente, PacienteUpdate(nombre="Ana")) == 1
+    assert crud.actualizar_paciente(10 ** 6, PacienteUpdate(nombre="Ana")) == 0
+
+    cita = CitaCreate(fecha_hora=datetime(2030, 3, 5, 9, 0), id_paciente=id_paciente, id_doctor=1)
+    assert crud.crear_cita(cita)
+    with pytest.raises(database.DuplicateKeyError):
+        crud.crear_cita(cita)
+
+def test_busqueda_en_historial_es_una_consulta():
+    """La búsqueda de texto (LIKE en SQLite) filtra por paciente y es una sola consulta"""
+    with database.track_queries() as stats:
+        resultados = crud.buscar_historial("hipertens enalapril", id_paciente=1)
+        otros = crud.buscar_historial("hipertensión", id_paciente=2)
+
+    assert stats.queries == 2
+    assert [h["id_historial"] for h in resultados] == [1]
+    assert otros == []
+    with pytest.raises(ValueError):
+        crud.buscar_historial("de la")
+
+def test_busqueda_de_pacientes_por_prefijo():
+    """El autocompletado es una consulta y busca por apellido, nombre, teléfono y email"""
+    crud.crear_pacientes([
+        PacienteCreate(nombre="Lucía", apellido="Zamora", fecha_nacimiento=date(1985, 5, 5),
+                       telefono="3009990001", email="lucia.zamora@prueba.com"),
+        PacienteCreate(nombre="Zoe", apellido="Lozano", fecha_nacimiento=date(1992, 2, 2),
+                       telefono="3009990002", email="zoe@prueba.com")
+    ])
+    with database.track_queries() as stats:
+        por_apellido = crud.buscar_pacientes("zam")
+    assert stats.queries == 1
+    assert [p["apellido"] for p in por_apellido] == ["Zamora"]
+
+    assert {p["apellido"] for p in crud.buscar_pacientes("300999")} == {"Zamora", "Lozano"}
+    assert [p["nombre"] for p in crud.buscar_pacientes("zoe@")] == ["Zoe"]
+    assert [p["nombre"] for p in crud.buscar_pacientes("lozano zo")] == ["Zoe"]
+    assert len(crud.buscar_pacientes("300999", limite=1)) == 1
+    assert crud.buscar_pacientes("100%") == []
+
+def test_citas_de_un_doctor_por_rango_de_fechas(sqlite_db):
+    """hasta es inclusivo y momento separa las citas pasadas de las próximas"""
+    doctor = crud.obtener_doctores_por_especialidad(sqlite_db, limite=1)[0]["id_doctor"]
+    crud.crear_cita(CitaCreate(fecha_hora=datetime(2030, 3, 6, 17, 30), id_paciente=1, id_doctor=doctor))
+
+    del_dia = crud.obtener_citas_doctor(doctor, desde=FECHA, hasta=FECHA)
+    assert [c["fecha_hora"] for c in del_dia] == [datetime(2030, 3, 4, 8, 0)]
+    assert len(crud.obtener_citas_doctor(doctor, desde=FECHA, hasta=date(2030, 3, 6))) == 2
+    assert len(crud.obtener_citas_doctor(doctor, momento="proximas")) == 2
+    assert crud.obtener_citas_doctor(doctor, momento="pasadas") == []
+    with pytest.raises(ValueError):
+        crud.obtener_citas_doctor(doctor, momento="ayer")
+
+def test_campos_pedidos_omiten_joins(sqlite_db):
+    """Con 'campos' la consulta lee solo esas columnas y omite los JOIN que no aportan ninguna"""
+    consultas = []
+    def registrar(query, elapsed, failed):
+        consultas.append(query)
+
+    database.add_query_listener(registrar)
+    try:
+        citas = crud.obtener_citas(limite=5, campos=["fecha_hora", "id_doctor"])
+    finally:
+        database._query_listeners.remove(registrar)
+
+    assert citas and set(citas[0]) == {"id_cita", "fecha_hora", "id_doctor"}
+    assert " JOIN " not in consultas[-1]
+    assert set(crud.obtener_cita(citas[0]["id_cita"], ["especialidad_nombre"])) == {
+        "id_cita", "fecha_hora", "especialidad_nombre"
+    }
+    assert set(crud.obtener_doctores_por_especialidad(sqlite_db, limite=1, campos=["nombre"])[0]) == {
+        "id_doctor", "nombre", "apellido"
+    }
+    with pytest.raises(ValueError):
+        crud.obtener_citas(campos=["contrasena"])
+
+def test_carga_masiva_informa_las_filas_rechazadas():
+    """Una fila rechazada por la base de datos no impide insertar las demás del bloque"""
+    citas = [
+        CitaCreate(fecha_hora=datetime(2030, 4, 1, 9, 0), id_paciente=1, id_doctor=1),
+        CitaCreate(fecha_hora=datetime(2030, 4, 1, 9, 0), id_paciente=2, id_doctor=1),  # horario repetido
+        CitaCreate(fecha_hora=datetime(2030, 4, 1, 9, 30), id_paciente=10 ** 6, id_doctor=1),  # paciente inexistente
+        CitaCreate(fecha_hora=datetime(2030, 4, 1, 10, 0), id_paciente=1, id_doctor=1)
+    ]
+    errores = []
+    ids = crud.crear_citas(citas, tamano_lote=10, errores=errores)
+
+    assert [indice for indice, _ in errores] == [1, 2]
+    assert [database.describe_integrity_error(error) for _, error in errores] == [
+        "El registro entra en conflicto con uno existente", "El registro hace referencia a otro que no existe"
+    ]
+    assert ids[1] is None and ids[2] is None
+    assert crud.obtener_cita(ids[0])["id_paciente"] == 1
+    assert crud.obtener_cita(ids[3])["fecha_hora"] == datetime(2030, 4, 1, 10, 0)
+
+    # Sin lista de errores la carga es todo o nada
+    with pytest.raises(database.DuplicateKeyError):
+        crud.crear_citas([CitaCreate(fecha_hora=datetime(2030, 4, 1, 11, 0), id_paciente=1, id_doctor=1), citas[0]])
+    assert crud.obtener_citas_doctor(1, desde=date(2030, 4, 1), hasta=date(2030, 4, 1), campos=["fecha_hora"]) == [
+        {"id_cita": ids[0], "fecha_hora": datetime(2030, 4, 1, 9, 0)},
+        {"id_cita": ids[3], "fecha_hora": datetime(2030, 4, 1, 10, 0)}
+    ]
+
+def test_motivo_de_rechazo_segun_la_restriccion():
+    """Cada restricción de SQLite se informa con su motivo; las demás, con uno genérico"""
+    import sqlite3
+    import sqlite_backend
+
+    errores = []
+    database.insert_many("cita", ["fecha_hora", "id_paciente", "id_doctor"], [(None, 1, 1)], errors=errores)
+    assert database.describe_integrity_error(errores[0][1]) == "Falta un campo obligatorio"
+
+    motivos = {
+        "FOREIGN KEY constraint failed": "El registro hace referencia a otro que no existe",
+        "CHECK constraint failed: fecha": "La base de datos rechazó el registro"
+    }
+    for mensaje, motivo in motivos.items():
+        error = sqlite_backend._error_pymysql(sqlite3.IntegrityError(mensaje))
+        assert database.describe_integrity_error(error) == motivo
+
+def test_exportacion_con_error_no_responde_200(monkeypatch):
+    """Un error al iniciar la exportación es un 503; uno a mitad de camino corta la respuesta"""
+    pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+    import main
+
+    cliente = TestClient(main.app)
+    monkeypatch.setattr(crud, "exportar_citas", lambda: database.stream_query("SELECT * FROM no_existe"))
+    assert cliente.get("/exportar/citas").status_code == 503
+
+    def falla_a_mitad():
+        yield [{"id_cita": 1}]
+        raise database.Error("Conexión perdida")
+
+    monkeypatch.setattr(crud, "exportar_citas", falla_a_mitad)
+    with pytest.raises(database.Error):
+        cliente.get("/exportar/citas")
+
+def test_error_no_controlado_se_registra_una_vez(monkeypatch, caplog):
+    """El middleware registra el error con el id de la petición y responde 500 sin relanzarlo"""
+    pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+    import main
+
+    def falla(*args):
+        raise RuntimeError("fallo inesperado")
+
+    monkeypatch.setattr(crud, "obtener_cita", falla)
+    respuesta = TestClient(main.app).get("/citas/1", headers={"X-Request-ID": "prueba-123"})
+
+    assert respuesta.status_code == 500
+    assert respuesta.headers["X-Request-ID"] == "prueba-123"
+    errores = [registro for registro in caplog.records if registro.exc_info]
+    assert len(errores) == 1 and errores[0].name == "main"
+
+def _pool_de_prueba(tmp_path, **opciones) -> database.ConnectionPool:
+    """Pool propio sobre un archivo SQLite, independiente del pool de la aplicación"""
+    import sqlite_backend
+    return database.ConnectionPool(
+        {"path": str(tmp_path / "pool.db"), "busy_timeout": 1},
+        connect=sqlite_backend.connect, **opciones
+    )
+
+def test_pool_agotado_espera_y_falla_por_tiempo(tmp_path):
+    """Sin conexiones libres, acquire espera acquire_timeout y falla; al liberar se reutiliza"""
+    pool = _pool_de_prueba(tmp_path, min_size=0, max_size=1, acquire_timeout=0.05)
+    conexion = pool.acquire()
+
+    with pytest.raises(database.Error, match="Tiempo de espera agotado"):
+        pool.acquire()
+    assert pool.stats()["timeouts"] == 1
+    assert pool.stats()["waits"] >= 1
+    assert pool.stats()["in_use"] == 1
+
+    pool.release(conexion)
+    assert pool.acquire() is conexion
+    stats = pool.stats()
+    assert (stats["created"], stats["reused"], stats["size"]) == (1, 1, 1)
+    pool.close()
+
+def test_pool_descarta_conexiones_rotas(tmp_path):
+    """discard=True, una conexión cerrada o una que falla el ping se cierran y liberan su lugar"""
+    pool = _pool_de_prueba(tmp_path, min_size=0, max_size=1, acquire_timeout=0.05,
+                           health_check_interval=0)
+
+    pool.release(pool.acquire(), discard=True)
+    assert pool.stats()["size"] == 0
+
+    conexion = pool.acquire()
+    conexion.close()
+    pool.release(conexion)
+    assert (pool.stats()["size"], pool.stats()["idle"]) == (0, 0)
+
+    # Queda ociosa abierta pero caída: el ping de la siguiente adquisición la descarta
+    conexion = pool.acquire()
+    pool.release(conexion)
+    conexion.open = False
+    nueva = pool.acquire()
+    assert nueva is not conexion
+    stats = pool.stats()
+    assert (stats["health_check_failures"], stats["created"], stats["closed"], stats["size"]) == (1, 4, 3, 1)
+    pool.release(nueva)
+    pool.close()
+
+def test_cache_expira_por_ttl(monkeypatch):
+    """Una entrada vencida se vuelve a cargar"""
+    import cache
+    reloj = [0.0]
+    monkeypatch.setattr(cache, "time", SimpleNamespace(monotonic=lambda: reloj[0]))
+    monkeypatch.setattr(cache, "_caches", {})
+    cargas = []
+    cache_prueba = cache.TTLCache("prueba_ttl", ttl=10)
+
+    def cargar():
+        cargas.append(reloj[0])
+        return len(cargas)
+
+    assert cache_prueba.get_or_load("clave", cargar) == 1
+    reloj[0] = 9.9
+    assert cache_prueba.get_or_load("clave", cargar) == 1
+    reloj[0] = 10
+    assert cache_prueba.get_or_load("clave", cargar) == 2
+    assert cargas == [0.0, 10]
+    assert cache_prueba.stats()["hits"] == 1
+
+def test_cache_no_guarda_lo_leido_durante_una_invalidacion(monkeypatch):
+    """Si una escritura invalida la caché mientras se carga, el valor leído no se guarda"""
+    import cache
+    monkeypatch.setattr(cache, "_caches", {})
+    cache_prueba = cache.TTLCache("prueba_generacion")
+
+    def cargar_con_escritura_concurrente():
+        cache_prueba.invalidate()
+        return "anterior a la escritura"
+
+    assert cache_prueba.get_or_load("clave", cargar_con_escritura_concurrente) == "anterior a la escritura"
+    assert cache_prueba.get("clave") is None
+    assert cache_prueba.get_or_load("clave", lambda: "vigente") == "vigente"
+    assert cache_prueba.get("clave") == "vigente"
+
+def test_catalogo_se_invalida_al_escribir():
+    """Las lecturas repetidas salen de la caché y cada escritura obliga a releer"""
+    id_especialidad = crud.crear_especialidad(EspecialidadCreate(nombre="Cardiología"))
+    with database.track_queries() as stats:
+        assert crud.obtener_especialidad(id_especialidad)["nombre"] == "Cardiología"
+        assert crud.obtener_especialidad(id_especialidad)["nombre"] == "Cardiología"
+    assert stats.queries == 1
+
+    crud.actualizar_especialidad(id_especialidad, EspecialidadUpdate(nombre="Cardiología Infantil"))
+    with database.track_queries() as stats:
+        assert crud.obtener_especialidad(id_especialidad)["nombre"] == "Cardiología Infantil"
+        assert id_especialidad in {e["id_especialidad"] for e in crud.obtener_especialidades()}
+    assert stats.queries == 2
+
+    crud.eliminar_especialidad(id_especialidad)
+    assert crud.obtener_especialidad(id_especialidad) is None
+    assert id_especialidad not in {e["id_especialidad"] for e in crud.obtener_especialidades()}
+
+def test_etag_responde_304_hasta_que_cambian_los_datos():
+    """If-None-Match con el ETag vigente da 304 sin cuerpo; tras una escritura vuelve el 200"""
+    pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+    import main
+
+    cliente = TestClient(main.app)
+    id_especialidad = cliente.post("/especialidades/", json={"nombre": "Dermatología"}).json()["id_especialidad"]
+    url = f"/especialidades/{id_especialidad}"
+
+    respuesta = cliente.get(url)
+    etag = respuesta.headers["ETag"]
+    assert respuesta.status_code == 200 and respuesta.json()["nombre"] == "Dermatología"
+
+    for if_none_match in (etag, f'"otro", W/{etag}'):
+        no_modificado = cliente.get(url, headers={"If-None-Match": if_none_match})
+        assert no_modificado.status_code == 304
+        assert no_modificado.content == b""
+        assert no_modificado.headers["ETag"] == etag
+    assert cliente.get(url, headers={"If-None-Match": '"otro"'}).status_code == 200
+
+    # Un listado paginado conserva el cursor de la página siguiente en el 304
+    pagina = cliente.get("/pacientes/", params={"limite": 1})
+    no_modificada = cliente.get("/pacientes/", params={"limite": 1}, headers={"If-None-Match": pagina.headers["ETag"]})
+    assert no_modificada.status_code == 304
+    assert no_modificada.headers["X-Next-Cursor"] == pagina.headers["X-Next-Cursor"]
+
+    assert cliente.put(url, json={"nombre": "Dermatología Clínica"}).status_code == 200
+    actualizada = cliente.get(url, headers={"If-None-Match": etag})
+    assert actualizada.status_code == 200
+    assert actualizada.headers["ETag"] != etag
+    assert actualizada.json()["nombre"] == "Dermatología Clínica"
+
+@pytest.mark.parametrize("valores", [[{}, "a", 1], [["a"], "b", 1], [True, "a", 1], [None, "a", 1]])
+def test_cursor_con_valores_no_escalares_es_400(valores):
+    """Un cursor con dicts, listas, booleanos o null se rechaza antes de llegar a la consulta"""
+    pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+    import main
+
+    cursor = base64.urlsafe_b64encode(json.dumps(valores).encode()).decode().rstrip("=")
+    respuesta = TestClient(main.app).get("/pacientes/", params={"cursor": cursor})
+    assert respuesta.status_code == 400
+    assert respuesta.json()["detail"] == "Cursor inválido"
+
+def test_catalogo_solo_guarda_el_catalogo_completo(sqlite_db):
+    """Cursores, límites y especialidades del cliente no agregan entradas a la caché"""
+    crud.invalidar_catalogo()
+    primera = crud.obtener_doctores(limite=5)
+    assert primera == crud.obtener_doctores()[:5]
+    tamano = crud._cache_catalogo.stats()["size"]
+
+    cursor = crud.siguiente_cursor(primera, 5, crud.ORDEN_DOCTORES)
+    for limite in range(1, 20):
+        crud.obtener_doctores(limite=limite, cursor=cursor)
+        crud.obtener_doctores_por_especialidad(sqlite_db, limite=limite)
+        crud.obtener_doctores_por_especialidad(10 ** 6 + limite)
+    assert crud._cache_catalogo.stats()["size"] == tamano
+
+    segunda = crud.obtener_doctores(limite=5, cursor=cursor)
+    assert [d["id_doctor"] for d in segunda] == [d["id_doctor"] for d in crud.obtener_doctores()[5:10]]
+
+def test_catalogo_que_no_pudo_leerse_no_queda_en_cache(monkeypatch):
+    """Un error al cargar el catálogo responde 503 y la lectura siguiente vuelve a la base"""
+    pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+    import main
+
+    crud.invalidar_catalogo()
+    monkeypatch.setattr(crud, "_listar", lambda *args, **kwargs: None)
+    cliente = TestClient(main.app)
+    assert cliente.get("/doctores/").status_code == 503
+    assert cliente.get("/especialidades/").status_code == 503
+    assert crud._cache_catalogo.stats()["size"] == 0
+
+    monkeypatch.undo()
+    assert len(cliente.get("/doctores/", params={"limite": 1000}).json()) >= DOCTORES
+
+def test_exportacion_devuelve_la_conexion_si_el_cliente_se_desconecta(monkeypatch):
+    """Un cliente que se desconecta a mitad de la exportación no deja la conexión tomada"""
+    pytest.importorskip("fastapi")
+    import main
+
+    def exportacion_lenta():
+        with closing(database.stream_query("SELECT id_cita FROM cita", chunk_size=1)) as bloques:
+            for bloque in bloques:
+                time.sleep(0.02)
+                yield bloque
+
+    async def desconectar_tras_el_primer_bloque():
+        desconectado = asyncio.Event()
+
+        async def receive():
+            await desconectado.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(mensaje):
+            if mensaje["type"] == "http.response.body" and mensaje.get("body"):
+                desconectado.set()
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": "/exportar/citas", "raw_path": b"/exportar/citas",
+            "query_string": b"", "headers": [], "client": ("prueba", 1), "server": ("prueba", 80)
+        }
+        await main.app(scope, receive, send)
+
+        # Se comprueba antes de que asyncio.run finalice los generadores pendientes
+        limite = time.monotonic() + 2
+        while database.get_pool_stats()["in_use"] and time.monotonic() < limite:
+            await asyncio.sleep(0.01)
+        return database.get_pool_stats()["in_use"]
+
+    # Se conserva una referencia: la conexión no debe depender de que el generador se recolecte
+    generadores = []
+    monkeypatch.setattr(crud, "exportar_citas", lambda: generadores.append(exportacion_lenta()) or generadores[-1])
+    try:
+        assert asyncio.run(desconectar_tras_el_primer_bloque()) == 0
+    finally:
+        for generador in generadores:
+            generador.close()